@@ -61,7 +61,7 @@ def calc_median(numbers):
         float: The median
     """
     n = len(numbers)
-    numbers.sort()
+    numbers = sorted(numbers)
     if n % 2 == 0:
         median1 = numbers[n//2]
         median2 = numbers[n//2 - 1]
@@ -71,6 +71,258 @@ def calc_median(numbers):
     return median
 
 
+class QuantileSketch:
+    """Approximate streaming quantiles with bounded memory (a merging t-digest)
+
+    Values are buffered and periodically merged into at most roughly `compression` weighted
+    centroids. Centroids are kept small near the tails and larger near the median, so extreme
+    quantiles stay accurate. Two sketches can be merged, e.g. across chunks or processes.
+
+    Args:
+        compression (int): Upper bound on the number of centroids kept (memory bound)
+
+    Methods:
+        add: Add one value
+        merge: Fold another sketch into this one
+        quantile: Estimate the value at a quantile between 0 and 1
+        median: Estimate the median
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self._centroids = []  # sorted list of [mean, weight]
+        self._buffer = []
+        self._buffer_size = 5 * compression
+
+    def __repr__(self):
+        return f"QuantileSketch(compression={self.compression}, count={self.count})"
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """Add one value to the sketch
+
+        Args:
+            value (float): The value to add
+        """
+        if self.count == 0 or value < self.minimum:
+            self.minimum = value
+        if self.count == 0 or value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self._buffer.append(value)
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """Fold the values summarized by `other` into this sketch
+
+        Args:
+            other (QuantileSketch): Another sketch; it is not modified
+
+        Returns:
+            QuantileSketch: This sketch
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0 or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.count == 0 or other.maximum > self.maximum:
+            self.maximum = other.maximum
+        self.count += other.count
+        self._centroids.extend([mean, weight] for mean, weight in other._centroids)
+        self._buffer.extend(other._buffer)
+        self._compress()
+        return self
+
+    def _k(self, q):
+        """Scale function: maps a quantile to a centroid index, stretching out the tails"""
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k):
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self):
+        """Merge the buffer into the centroids, keeping each centroid within its size limit"""
+        points = self._centroids + [[value, 1] for value in self._buffer]
+        self._buffer = []
+        if not points:
+            return
+        points.sort(key=lambda point: point[0])
+        total = self.count
+        k_max = self.compression / 4
+
+        merged = [list(points[0])]
+        weight_before = 0
+        q_limit = self._k_inverse(min(self._k(0) + 1, k_max))
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            if (weight_before + current[1] + weight) / total <= q_limit:
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                weight_before += current[1]
+                q_limit = self._k_inverse(
+                    min(self._k(weight_before / total) + 1, k_max))
+                merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q):
+        """Estimate the value at quantile `q`
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: The estimate. None if no values were added.
+        """
+        if self.count == 0:
+            return None
+        if self._buffer:
+            self._compress()
+        centroids = self._centroids
+        if q <= 0 or len(centroids) == 1 and centroids[0][1] == 1:
+            return self.minimum if q <= 0.5 else self.maximum
+        if q >= 1:
+            return self.maximum
+
+        # Each centroid's mean sits at the middle of its weight; interpolate between those points,
+        # using the exact minimum and maximum as the outermost points.
+        target = q * self.count
+        previous_position = 0
+        previous_value = self.minimum
+        cumulative = 0
+        for mean, weight in centroids:
+            position = cumulative + weight / 2
+            if target < position:
+                fraction = (target - previous_position) / (position - previous_position)
+                return previous_value + fraction * (mean - previous_value)
+            previous_position = position
+            previous_value = mean
+            cumulative += weight
+        if self.count == previous_position:
+            return self.maximum
+        fraction = (target - previous_position) / (self.count - previous_position)
+        return previous_value + fraction * (self.maximum - previous_value)
+
+    def median(self):
+        """Estimate the median. None if no values were added."""
+        return self.quantile(0.5)
+
+
+class RunningStats:
+    """One-pass summary statistics of a stream of numbers
+
+    Mean and variance are accumulated with Welford's algorithm, so the numbers never have to be
+    kept in memory; the median is estimated with a QuantileSketch. Accumulators from separate
+    chunks or processes can be combined with merge.
+
+    Args:
+        numbers (iterable): Optional numbers to add right away
+        compression (int): Memory bound of the quantile sketch
+
+    Attributes:
+        count (int): The number of values added
+        mean (float): The running average (0.0 if empty)
+        minimum (float): The smallest value (None if empty)
+        maximum (float): The largest value (None if empty)
+
+    Methods:
+        add: Add one value
+        update: Add every value of an iterable
+        merge: Fold another accumulator into this one
+        variance, std_dev, median, quantile: The summary statistics
+    """
+
+    def __init__(self, numbers=(), compression=100):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.sketch = QuantileSketch(compression)
+        self.update(numbers)
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean})"
+
+    def add(self, value):
+        """Add one value
+
+        Args:
+            value (float): The value to add
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        self.sketch.add(value)
+
+    def update(self, numbers):
+        """Add every value of `numbers`
+
+        Args:
+            numbers (iterable): Floats; consumed lazily
+
+        Returns:
+            RunningStats: This accumulator
+        """
+        for value in numbers:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """Fold the values summarized by `other` into this accumulator (Chan et al.)
+
+        Args:
+            other (RunningStats): Another accumulator; it is not modified
+
+        Returns:
+            RunningStats: This accumulator
+        """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+        self.sketch.merge(other.sketch)
+        return self
+
+    def variance(self):
+        """The sample variance. None if fewer than two values were added."""
+        if self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    def std_dev(self):
+        """The sample standard deviation. 0.0 if fewer than two values were added."""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.variance())
+
+    def median(self):
+        """The approximate median. None if no values were added."""
+        return self.sketch.median()
+
+    def quantile(self, q):
+        """The approximate value at quantile `q` (between 0 and 1)."""
+        return self.sketch.quantile(q)
+
+
 def main():
     numbers = []
     while True:
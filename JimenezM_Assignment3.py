@@ -1,6 +1,9 @@
+import argparse
+import mmap
+import multiprocessing
+import os
 import re
 import sys
-import textwrap
 
 
 def get_header(record):
@@ -48,7 +51,7 @@ def get_sequence(record):
     Returns:
         sequence(str): Fasta-formatted sequence
     """
-    sequence = ''
+    chunks = []
     origin_began = False
     lines = record.splitlines()
     for line in lines:
@@ -57,10 +60,11 @@ def get_sequence(record):
             break
         elif origin_began:
             line_parts = line.split(' ', 1)
-            sequence += line_parts[1].replace(' ', '').upper()
+            chunks.append(line_parts[1].replace(' ', ''))
         elif line == 'ORIGIN':
             origin_began = True
-    return '\n'.join(textwrap.wrap(sequence, 70))
+    sequence = ''.join(chunks).upper()
+    return '\n'.join(sequence[i:i + 70] for i in range(0, len(sequence), 70))
 
 
 def split_records(filename):
@@ -84,32 +88,328 @@ def split_records(filename):
         print('File not found: "%s"' % filename)
         return []
 
-    entries = []
-    current_entry = ''
+    with record_file:
+        return list(iter_records(record_file))
+
+
+def iter_records(record_file):
+    """
+    Generator that reads an open GenBank file and yields one entry at a time, so only the current
+    entry is held in memory. Lines are collected in a list and joined once per entry.
+
+    Args:
+        record_file(File): File object (or any iterable of lines) representing a GenBank file
+
+    Yields:
+        record(str): a single GenBank entry, including the final "//" line
+    """
+    lines = []
     for line in record_file:
-        current_entry += line
+        lines.append(line)
         if line == '//\n':
-            entries.append(current_entry)
-            current_entry = ''
+            yield ''.join(lines)
+            lines = []
 
-    return entries
 
+def format_fasta(record):
+    """
+    Convert a single GenBank entry to a FASTA entry, followed by a blank line.
 
-def main(argv):
-    try:
-        input_filename = sys.argv[1]
-        output_filename = sys.argv[2]
-    except:
-        print('Required arguments: <input_file> <output_file>')
-        return
+    Args:
+        record(str): a genbank record
+
+    Returns:
+        fasta(str): the FASTA header and wrapped sequence
+    """
+    return '%s\n%s\n\n' % (get_header(record), get_sequence(record))
+
+
+def iter_file_records(input_filenames):
+    """
+    Generator that yields the GenBank entries of several files in order, one file after another.
+    Files that cannot be opened are reported and skipped.
+
+    Args:
+        input_filenames(list of str): file paths to the input GenBank files
+
+    Yields:
+        record(str): a single GenBank entry, including the final "//" line
+    """
+    for input_filename in input_filenames:
+        try:
+            record_file = open(input_filename, 'r')
+        except OSError:
+            print('File not found: "%s"' % input_filename)
+            continue
+        with record_file:
+            yield from iter_records(record_file)
+
+
+def convert_files(input_filenames, output_file, workers=1, chunksize=64):
+    """
+    Convert the GenBank files `input_filenames` to FASTA and write the entries to `output_file`.
+
+    The input is split at the "//" entry boundaries in this process. With more than one worker the
+    entries are converted by a process pool; results are written in input order, so the output is
+    identical to a single-process run.
 
-    records = split_records(input_filename)
-    with open(output_filename, 'w') as output_file:
+    Args:
+        input_filenames(list of str): file paths to the input GenBank files
+        output_file(File): File object the FASTA entries will be written to
+        workers(int): number of worker processes; 1 converts in this process
+        chunksize(int): number of entries sent to a worker at a time
+
+    Returns:
+        count(int): the number of entries written
+    """
+    records = iter_file_records(input_filenames)
+    count = 0
+    if workers <= 1:
         for record in records:
-            output_file.write(get_header(record))
-            output_file.write('\n')
-            output_file.write(get_sequence(record))
-            output_file.write('\n\n')
+            output_file.write(format_fasta(record))
+            count += 1
+        return count
+
+    with multiprocessing.Pool(workers) as pool:
+        for fasta in pool.imap(format_fasta, records, chunksize):
+            output_file.write(fasta)
+            count += 1
+    return count
+
+
+# First line of a ".gbi" index; an index without it is from an older layout and is rebuilt.
+GBI_HEADER = b'#gbi\t2\n'
+
+
+def build_index(filename, index_filename=None):
+    """
+    Scan a GenBank file once and write a sidecar index with one tab-separated line per entry:
+    accession, VERSION, byte offset, byte length and DEFINITION, in the spirit of a samtools
+    ".fai" file. Lines are sorted by accession so the index can be binary searched in place;
+    entries without a VERSION line cannot be looked up and are left out.
+
+    Args:
+        filename(str): a file path to the input GenBank file
+        index_filename(str): path of the index to write; defaults to `filename` + ".gbi"
+
+    Returns:
+        index_filename(str): the path of the written index
+    """
+    if index_filename is None:
+        index_filename = filename + '.gbi'
+
+    lines = []
+    with open(filename, 'rb') as record_file:
+        offset = 0
+        start = 0
+        version = None
+        definition = None
+        for line in record_file:
+            offset += len(line)
+            if version is None and line.startswith(b'VERSION '):
+                version = line.split(None, 2)[1].decode()
+            elif definition is None and line.startswith(b'DEFINITION '):
+                definition = line.split(b' ', 1)[1].decode().strip().rstrip(
+                    '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~')
+            elif line.rstrip(b'\r\n') == b'//':
+                if version is not None:
+                    lines.append('%s\t%s\t%d\t%d\t%s\n' % (version.split('.', 1)[0], version,
+                                                            start, offset - start, definition))
+                start = offset
+                version = None
+                definition = None
+
+    # A stable sort keeps the entries of one accession in file order.
+    lines.sort(key=lambda line: line.split('\t', 1)[0].encode())
+    with open(index_filename, 'wb') as index_file:
+        index_file.write(GBI_HEADER)
+        index_file.write(''.join(lines).encode())
+    return index_filename
+
+
+class GenBankIndex:
+    """
+    Random access to the entries of a GenBank file through its ".gbi" index. Both files are
+    memory-mapped: an accession is found by a binary search over the sorted index lines, and only
+    the requested entries are read and converted, so opening the index costs nothing per entry.
+
+    Args:
+        filename(str): a file path to the GenBank file
+        index_filename(str): path of the index; defaults to `filename` + ".gbi". The index is
+            (re)built if it is missing, older than the GenBank file or from an older layout.
+
+    Methods:
+        find: Return the offset, length and definition of an accession
+        get_record: Return the raw GenBank entry for an accession
+        get_fasta: Return the FASTA entry for an accession
+        close: Release the memory maps
+    """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        if index_filename is None:
+            index_filename = filename + '.gbi'
+        if not os.path.exists(index_filename) or \
+                os.path.getmtime(index_filename) < os.path.getmtime(filename):
+            build_index(filename, index_filename)
+        else:
+            with open(index_filename, 'rb') as index_file:
+                if index_file.readline() != GBI_HEADER:
+                    build_index(filename, index_filename)
+
+        with open(index_filename, 'rb') as index_file:
+            self._index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file = open(filename, 'rb')
+        if os.path.getsize(filename):
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''
+
+    def __repr__(self):
+        return f"GenBankIndex({self.filename})"
+
+    def __contains__(self, accession):
+        return self.find(accession) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memory maps and the underlying file"""
+        self._index.close()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def find(self, accession):
+        """
+        Return (offset, length, definition) of the entry for `accession`, with or without version
+        suffix, or None if it is not in the index. Without a version the first entry of the
+        accession in the GenBank file is returned.
+        """
+        index = self._index
+        key = accession.split('.', 1)[0].encode()
+
+        # Binary search for the first line whose accession is not less than `key`; `low` and
+        # `high` are always line starts.
+        low = len(GBI_HEADER)
+        high = len(index)
+        while low < high:
+            start = index.rfind(b'\n', low, (low + high) // 2) + 1
+            if not start:
+                start = low
+            if index[start:index.find(b'\t', start)] < key:
+                low = index.find(b'\n', start) + 1
+            else:
+                high = start
+
+        while low < len(index):
+            end = index.find(b'\n', low)
+            fields = index[low:end].decode().split('\t', 4)
+            if fields[0].encode() != key:
+                break
+            if accession in (fields[0], fields[1]):
+                return int(fields[2]), int(fields[3]), fields[4]
+            low = end + 1
+        return None
+
+    def get_record(self, accession):
+        """
+        Return the GenBank entry for `accession` (with or without version suffix), or None if it is
+        not in the index.
+        """
+        entry = self.find(accession)
+        if entry is None:
+            return None
+        offset, length, definition = entry
+        return self._map[offset:offset + length].decode()
+
+    def get_fasta(self, accession):
+        """Return the FASTA entry for `accession`, or None if it is not in the index."""
+        record = self.get_record(accession)
+        if record is None:
+            return None
+        return format_fasta(record)
+
+
+def fetch_fasta(task):
+    """
+    Look up a batch of accessions in one GenBank file and convert the entries that are found.
+    Runs in a worker process of convert_accessions.
+
+    Args:
+        task(tuple): (GenBank file path, list of accessions)
+
+    Returns:
+        (count, fasta): the number of entries found and their FASTA entries, in accession order
+    """
+    filename, accessions = task
+    with GenBankIndex(filename) as index:
+        entries = [fasta for fasta in map(index.get_fasta, accessions) if fasta is not None]
+    return len(entries), ''.join(entries)
+
+
+def convert_accessions(input_filenames, accessions, output_file, workers=1, chunksize=64):
+    """
+    Convert the entries of `accessions` found in the GenBank files `input_filenames` to FASTA,
+    looked up through a ".gbi" index next to each input. Entries are written file by file, in
+    accession order; with more than one worker batches of accessions are looked up and converted
+    by a process pool, and the output is identical to a single-process run.
+
+    Args:
+        input_filenames(list of str): file paths to the input GenBank files
+        accessions(list of str): accessions, with or without version suffix
+        output_file(File): File object the FASTA entries will be written to
+        workers(int): number of worker processes; 1 converts in this process
+        chunksize(int): number of accessions sent to a worker at a time
+
+    Returns:
+        count(int): the number of entries written
+    """
+    # Build missing indexes here, so that workers never write the same index at once.
+    for input_filename in input_filenames:
+        GenBankIndex(input_filename).close()
+
+    tasks = [(input_filename, accessions[i:i + chunksize]) for input_filename in input_filenames
+             for i in range(0, len(accessions), chunksize)]
+    count = 0
+    if workers <= 1:
+        for found, fasta in map(fetch_fasta, tasks):
+            output_file.write(fasta)
+            count += found
+        return count
+
+    with multiprocessing.Pool(workers) as pool:
+        for found, fasta in pool.imap(fetch_fasta, tasks):
+            output_file.write(fasta)
+            count += found
+    return count
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Convert GenBank files to a single FASTA file.')
+    parser.add_argument('input_files', nargs='+',
+                        help='one or more GenBank files, converted in the given order')
+    parser.add_argument('output_file', help='FASTA file to write')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes (default: 1)')
+    parser.add_argument('--accessions',
+                        help='file with one accession per line; only these entries are '
+                        'converted, looked up through a ".gbi" index next to each input')
+    args = parser.parse_args(argv[1:])
+
+    with open(args.output_file, 'w') as output_file:
+        if args.accessions is None:
+            convert_files(args.input_files, output_file, args.workers)
+            return
+
+        with open(args.accessions) as accession_file:
+            accessions = [line.strip() for line in accession_file if line.strip()]
+        convert_accessions(args.input_files, accessions, output_file, args.workers)
 
 
 if __name__ == '__main__':
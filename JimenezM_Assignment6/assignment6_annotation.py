@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 # assignment6_annotation.py
 
-from matrix import Matrix
-from blast import Blast
+import os
+import sys
+from array import array
+
+# The columnar report format lives with Assignment 5.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "JimenezM_Assignment_5"))
+from diff_exp_annotations import write_columnar_report  # noqa: E402
+from diffexp import read_diff_exp  # noqa: E402
+from matrix import parse_value  # noqa: E402
 
 
 def tuple_to_string(transcript_info):
@@ -16,24 +24,56 @@ def tuple_to_string(transcript_info):
     return "\t".join(transcript_info.data_attributes())
 
 
-def main():
-    # Openfiles and create their objects
-    blast_filename = "blastp.outfmt6"
-    diff_exp_filename = "diffExpr.P1e-3_C2.matrix"
-    blast = Blast(blast_filename)
-    matrix = Matrix(diff_exp_filename)
+def write_id_output(diff_exp_file, blast_dict, output_file):
+    """Stream the matrix with each transcript ID replaced by its SwissProt ID, where it has one
+    Args:
+        diff_exp_file(file): An open differential expression matrix
+        blast_dict(dict): Transcript ID to SwissProt ID
+        output_file(file): Text file to write to
+    Raises:
+        ValueError: If a row does not have one value per sample
+    """
+
+    output_file.writelines(blast_dict.get(info.transcript, info.transcript) + "\t"
+                           + tuple_to_string(info) + "\n" for info in read_diff_exp(diff_exp_file))
+
+
+def write_columnar_output(diff_exp_file, blast_dict, filename):
+    """Write the annotated matrix in the binary columnar format, one float32 column per sample
+    Args:
+        diff_exp_file(file): An open differential expression matrix
+        blast_dict(dict): Transcript ID to SwissProt ID
+        filename(str): Path of the columnar file
+    Raises:
+        ValueError: If a row does not have one value per sample
+    """
+
+    rows = read_diff_exp(diff_exp_file)
+    samples = next(rows).values
+    ids = []
+    columns = [array("f") for _ in samples]
+    for info in rows:
+        ids.append(blast_dict.get(info.transcript, info.transcript))
+        for column, value in zip(columns, info.values):
+            column.append(parse_value(value))
+    write_columnar_report(filename, [("id", "dict", ids)] + list(zip(
+        samples, ["float32"] * len(samples), columns)))
+
 
-    # Load transcript_id and sp_id within the good BlastHit into dict
-    blast_dict = {blast.transcript_id: blast.sp_id
-                  for blast in blast.blast_hit_list if blast.hit_good_match()}
+def main(argv):
+    # Best good (>95% identity) BlastHit of each transcript, ranked by bitscore then evalue,
+    # replaces the transcript ID in the matrix.
+    from annotation_pipeline import main as run_pipeline
 
-    # Look-up and output file
-    with open("output.txt", "w") as output:
-        for info in matrix.expressions:
-            matrix_info = blast_dict.get(info.transcript, info.transcript) \
-                + "\t" + tuple_to_string(info)
-            output.write(matrix_info + "\n")
+    run_pipeline(argv, defaults={
+        "blast": "blastp.outfmt6",
+        "matrix": "diffExpr.P1e-3_C2.matrix",
+        "output": "output.txt",
+        "format": "ids",
+        "min_pident": 95,
+        "ranking": ("bitscore", "evalue"),
+    })
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# benchmark_blast.py
+#
+# Compare single-process and multi-process best-hit parsing of a BLAST outfmt6 file.
+# Usage: benchmark_blast.py [<copies of blastp.outfmt6>] [<workers>]
+
+import os
+import sys
+import tempfile
+import time
+
+from blast import Blast, best_hits, parallel_best_hits
+
+
+def main(argv):
+    copies = int(argv[1]) if len(argv) > 1 else 200
+    workers = int(argv[2]) if len(argv) > 2 else os.cpu_count()
+
+    with open("blastp.outfmt6") as blast_file:
+        lines = blast_file.read().splitlines()
+
+    # Every copy repeats the same queries, so each query's hits are spread over many chunks
+    # and the cross-chunk merge is exercised.
+    with tempfile.NamedTemporaryFile("w", suffix=".outfmt6", delete=False) as large_file:
+        for copy in range(copies):
+            large_file.write("\n".join(lines) + "\n")
+    size = os.path.getsize(large_file.name)
+    print(f"{copies * len(lines)} hits, {size / 1e6:.1f} MB, {workers} workers")
+
+    try:
+        start = time.perf_counter()
+        serial = list(best_hits(Blast(large_file.name, streaming=True), grouped=False))
+        serial_time = time.perf_counter() - start
+        print(f"single process: {serial_time:.2f} s ({size / 1e6 / serial_time:.1f} MB/s)")
+
+        start = time.perf_counter()
+        parallel = parallel_best_hits(large_file.name, workers)
+        parallel_time = time.perf_counter() - start
+        print(f"parallel:       {parallel_time:.2f} s ({size / 1e6 / parallel_time:.1f} MB/s)"
+              f", {serial_time / parallel_time:.1f}x")
+
+        same = [(query, hit.blast_hit) for query, hit in serial] == \
+            [(query, hit.blast_hit) for query, hit in parallel]
+        print("results identical:", same)
+    finally:
+        os.remove(large_file.name)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,6 +1,7 @@
 # blasts.py
 
-import re
+import multiprocessing
+import os
 
 
 class BlastHit:
@@ -12,18 +13,26 @@ class BlastHit:
         sp_id(str): The SwissPort ID within the subject sequence ID
         pident(float): The percent of identical match
         mismatch(int): The number of mismatches
+        qseqid, sseqid, length, gapopen, qstart, qend, sstart, send, evalue, bitscore:
+            The remaining outfmt6 columns; parsed from the raw line on every use
     Methods:
         __lt__: Returns if the hit has less mismatch
         hit_good_match: Return True if the record has >95 identity
     """
 
+    # No per-instance __dict__: a hit is the raw line and three parsed fields. The other columns
+    # are read from the line when asked for and never stored, so ranking a hit by bitscore does
+    # not keep twelve column strings alive for every hit.
+    __slots__ = ("blast_hit", "transcript_id", "sp_id", "pident")
+
     def __init__(self, blast_hit):
         self.blast_hit = blast_hit
-        column = blast_hit.split("\t")
-        self.transcript_id = re.search(r"(\S+)\|\S+", column[0]).group(1)
-        self.sp_id = re.search(r".+sp\|(.+)\..+", column[1]).group(1)
-        self.pident = float(column[2])
-        self.mismatch = int(column[4])
+        qseqid, sseqid, pident, _ = blast_hit.split("\t", 3)
+        self.transcript_id = qseqid.rpartition("|")[0]
+        # gi|74665200|sp|Q9HGP0.1|PVG4_SCHPO -> Q9HGP0
+        accession = sseqid.rpartition("sp|")[2].partition("|")[0]
+        self.sp_id = accession.rpartition(".")[0] or accession
+        self.pident = float(pident)
 
     def __repr__(self):
         return f"BlastHit({self.blast_hit})"
@@ -35,28 +44,211 @@ class BlastHit:
             raise Exception("Mismatch object must be the same type.")
         return self.mismatch < other.mismatch
 
+    def _column(self, index):
+        """Return column `index` of the hit, splitting the raw line only as far as needed"""
+
+        if index >= 10:
+            # evalue and bitscore, the ranking columns, are the last two of the 12 outfmt6
+            # columns, so they are split off the end of the line.
+            return self.blast_hit.rstrip("\n").rsplit("\t", 12 - index)[index - 12]
+        return self.blast_hit.split("\t", index + 1)[index]
+
+    qseqid = property(lambda self: self._column(0))
+    sseqid = property(lambda self: self._column(1))
+    length = property(lambda self: int(self._column(3)))
+    mismatch = property(lambda self: int(self._column(4)))
+    gapopen = property(lambda self: int(self._column(5)))
+    qstart = property(lambda self: int(self._column(6)))
+    qend = property(lambda self: int(self._column(7)))
+    sstart = property(lambda self: int(self._column(8)))
+    send = property(lambda self: int(self._column(9)))
+    evalue = property(lambda self: float(self._column(10)))
+    bitscore = property(lambda self: float(self._column(11)))
+
     def hit_good_match(self):
         """Return boolean True if the record is a good really match (>95%)"""
 
         return self.pident > 95
 
 
+def iter_blast_hits(blast_file):
+    """Yield a BlastHit for every non-empty line of an open outfmt6 file
+    Arg:
+        blast_file(File): File object, or any iterable of lines
+    """
+    for line in blast_file:
+        if line.strip():
+            yield BlastHit(line.rstrip("\n"))
+
+
+# How each ranking key is read from a hit, and whether larger values rank higher.
+RANKING_KEYS = {
+    "bitscore": (lambda hit: hit.bitscore, True),
+    "evalue": (lambda hit: hit.evalue, False),
+    "pident": (lambda hit: hit.pident, True),
+    # outfmt6 has no query length, so coverage is the aligned query span.
+    "coverage": (lambda hit: hit.qend - hit.qstart + 1, True),
+}
+
+
+def ranking(keys):
+    """Return a function mapping a BlastHit to a tuple that is larger for better hits
+    Arg:
+        keys(sequence): Names from RANKING_KEYS, most significant first
+    """
+    try:
+        getters = [RANKING_KEYS[key] for key in keys]
+    except KeyError as error:
+        raise ValueError(f"Unknown ranking key {error}; expected one of "
+                         f"{', '.join(RANKING_KEYS)}") from None
+    signs = [1 if larger_is_better else -1 for get, larger_is_better in getters]
+    getters = [get for get, larger_is_better in getters]
+    if len(getters) == 1:
+        get, sign = getters[0], signs[0]
+        return lambda hit: (sign * get(hit),)
+    pairs = list(zip(getters, signs))
+    return lambda hit: tuple([sign * get(hit) for get, sign in pairs])
+
+
+def best_hits(hits, keys=("bitscore", "evalue"), min_pident=None, query="transcript_id",
+              grouped=True):
+    """Reduce BlastHits to the best hit per query in a single pass
+    Args:
+        hits(iterable): BlastHit objects, e.g. a streaming Blast
+        keys(sequence): Ranking keys from RANKING_KEYS, most significant first;
+            ties keep the earlier hit, so no keys selects the first hit of each query
+        min_pident(float): If given, only hits with pident above this are considered
+        query(str): BlastHit attribute that identifies the query
+        grouped(bool): If True the input is assumed to be grouped by query, as BLAST and
+            DIAMOND write it, and each best hit is yielded as soon as the query changes. A
+            query that reappears later is reduced again and yielded again. If False, the best
+            hit per query is kept until the input ends.
+    Yields:
+        tuple: (query ID, best BlastHit), in order of first appearance
+    """
+    rank = ranking(keys)
+    if grouped:
+        current = None
+        best = None
+        best_rank = None
+        for hit in hits:
+            if min_pident is not None and not hit.pident > min_pident:
+                continue
+            hit_query = getattr(hit, query)
+            hit_rank = rank(hit)
+            if hit_query != current:
+                if best is not None:
+                    yield current, best
+                current, best, best_rank = hit_query, hit, hit_rank
+            elif hit_rank > best_rank:
+                best, best_rank = hit, hit_rank
+        if best is not None:
+            yield current, best
+        return
+
+    best = {}
+    for hit in hits:
+        if min_pident is not None and not hit.pident > min_pident:
+            continue
+        hit_query = getattr(hit, query)
+        hit_rank = rank(hit)
+        previous = best.get(hit_query)
+        if previous is None or hit_rank > previous[0]:
+            best[hit_query] = (hit_rank, hit)
+    for hit_query, (hit_rank, hit) in best.items():
+        yield hit_query, hit
+
+
+def chunk_ranges(blast_filename, chunks):
+    """Split a file into about `chunks` byte ranges that start and end on line boundaries
+    Args:
+        blast_filename(str): An outfmt6 file
+        chunks(int): Number of ranges wanted
+    Returns:
+        list: (start, end) byte offsets covering the whole file, in order
+    """
+    size = os.path.getsize(blast_filename)
+    boundaries = [0]
+    with open(blast_filename, "rb") as blast_file:
+        for chunk in range(1, chunks):
+            position = size * chunk // chunks
+            if position <= boundaries[-1]:
+                continue
+            blast_file.seek(position - 1)
+            # Move to the first byte after the next newline (position itself if it starts a line).
+            blast_file.readline()
+            position = blast_file.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def _best_hits_in_range(args):
+    """Pool worker: best hits of one byte range, as (query, rank, line) tuples"""
+
+    blast_filename, start, end, keys, min_pident, query = args
+    with open(blast_filename, "rb") as blast_file:
+        blast_file.seek(start)
+        lines = blast_file.read(end - start).decode().splitlines()
+    rank = ranking(keys)
+    return [(hit_query, rank(hit), hit.blast_hit)
+            for hit_query, hit in best_hits(iter_blast_hits(lines), keys, min_pident, query,
+                                            grouped=False)]
+
+
+def parallel_best_hits(blast_filename, workers=None, keys=("bitscore", "evalue"),
+                       min_pident=None, query="transcript_id", chunks=None):
+    """Best hit per query of an outfmt6 file, parsed by a process pool
+    Each worker parses one newline-aligned byte range and reduces it to its best hits. The
+    per-chunk results are merged in file order, so a query split across a chunk boundary gets
+    the same best hit, ties included, as best_hits(..., grouped=False) on the whole file.
+    Args:
+        blast_filename(str): An outfmt6 file
+        workers(int): Number of worker processes (default: number of CPUs)
+        keys, min_pident, query: As for best_hits
+        chunks(int): Number of byte ranges (default: 4 per worker)
+    Returns:
+        list: (query ID, best BlastHit) tuples, in order of first appearance
+    """
+    workers = workers or os.cpu_count() or 1
+    ranking(keys)  # validate the keys before starting any process
+    ranges = chunk_ranges(blast_filename, chunks or 4 * workers)
+    jobs = [(blast_filename, start, end, tuple(keys), min_pident, query)
+            for start, end in ranges]
+
+    best = {}
+    with multiprocessing.Pool(workers) as pool:
+        for chunk_hits in pool.imap(_best_hits_in_range, jobs):
+            for hit_query, hit_rank, line in chunk_hits:
+                previous = best.get(hit_query)
+                if previous is None or hit_rank > previous[0]:
+                    best[hit_query] = (hit_rank, line)
+    return [(hit_query, BlastHit(line)) for hit_query, (hit_rank, line) in best.items()]
+
+
 class Blast:
     """Collections of Blast objects
     Arg:
         blast_filename(string): A blast filename
+        streaming(bool): If True, hits are not kept in memory; each iteration re-reads
+            the file and yields one BlastHit at a time
     Attribute:
-        hits(list): A list of Blast objects from the .outfmt6 file
+        blast_hit_list(list): A list of Blast objects from the .outfmt6 file
+            (None in streaming mode)
     Method:
         __iter__: Return iterator of the blast input
     """
 
-    def __init__(self, blast_filename):
+    def __init__(self, blast_filename, streaming=False):
         self.blast_filename = blast_filename
-        with open(blast_filename) as blast_file:
-            blast_hits = blast_file.read()
-            blast_hits = blast_hits.rstrip("\n").split("\n")
-            self.blast_hit_list = [BlastHit(hit) for hit in blast_hits]
+        self.streaming = streaming
+        self.blast_hit_list = None
+        if not streaming:
+            with open(blast_filename) as blast_file:
+                self.blast_hit_list = list(iter_blast_hits(blast_file))
 
     def __repr__(self):
         return f"Blast({self.blast_filename})"
@@ -64,4 +256,12 @@ class Blast:
     def __iter__(self):
         """Return an iterator over the extracted BlastHit objects"""
 
-        return iter(self.blast_hit_list)
+        if not self.streaming:
+            return iter(self.blast_hit_list)
+        return self._stream()
+
+    def _stream(self):
+        """Read the file and yield one BlastHit at a time"""
+
+        with open(self.blast_filename) as blast_file:
+            yield from iter_blast_hits(blast_file)
@@ -6,6 +6,7 @@ class DiffExp:
         transcript_info(string): One differential expression informtation.
     Attributes:
         transcript(str):
+        values(tuple): The sample values, in column order
         sp_ds(float): diauxic shift
         sp_hs(float): heat shock
         sp_log(float): logarithmic growth
@@ -16,13 +17,49 @@ class DiffExp:
 
     def __init__(self, transcript_info):
         self.transcript_info = transcript_info
-        self.transcript, self.sp_ds, self.sp_hs, self.sp_log, self.sp_plat \
-            = transcript_info.rstrip().split("\t")
+        self.transcript, *values = transcript_info.rstrip().split("\t")
+        self.values = tuple(values)
 
     def __repr__(self):
         return f"DiffExp({self.transcript_info})"
 
+    @property
+    def sp_ds(self):
+        return self.values[0]
+
+    @property
+    def sp_hs(self):
+        return self.values[1]
+
+    @property
+    def sp_log(self):
+        return self.values[2]
+
+    @property
+    def sp_plat(self):
+        return self.values[3]
+
     def data_attributes(self):
         """Return tuple that contains data sample attributes"""
 
-        return (self.sp_ds, self.sp_hs, self.sp_log, self.sp_plat)
+        return self.values
+
+
+def read_diff_exp(diff_exp_file):
+    """Yield one DiffExp per line of an open matrix file, the header first, without keeping them
+    Args:
+        diff_exp_file(file): An open differential expression matrix
+    Raises:
+        ValueError: If a row does not have one value per sample of the header
+    """
+
+    name = getattr(diff_exp_file, "name", "matrix")
+    header = DiffExp(next(diff_exp_file, ""))
+    width = len(header.values)
+    yield header
+    for line_number, line in enumerate(diff_exp_file, 2):
+        info = DiffExp(line)
+        if len(info.values) != width:
+            raise ValueError(f"{name}, line {line_number}: expected {width} values for "
+                             f"{info.transcript}")
+        yield info
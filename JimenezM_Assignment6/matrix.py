@@ -1,26 +1,197 @@
 # matrix.py
 
+import math
+from array import array
+
 from diffexp import DiffExp
 
+
+def parse_value(value):
+    """Return `value` as a float; values that are not numbers, such as NA, become NaN"""
+
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def value_precision(value):
+    """Return the decimals, significant digits and whether `value` uses an exponent, as written"""
+
+    mantissa, exponent, _ = value.lower().partition("e")
+    whole, _, fraction = mantissa.lstrip("+-").partition(".")
+    return len(fraction), len((whole + fraction).lstrip("0")) or 1, bool(exponent)
+
+
 class Matrix:
-    """Collections of differential expression objects
+    """Columnar store of a differential expression matrix
     Arg:
         diff_exp_filename: One differential expresssion matrix filename
-    Attribute:
-        expression(list): A list of DiffExp objects
-    Method:
-        __iter__: Return iterator of the diff_exp input
+    Attributes:
+        samples(list): Sample column names, read from the header line
+        transcripts(list): Transcript IDs, in file order
+        index(dict): Mapping from transcript ID to its row number
+        values(array): Expression values as one contiguous float64 array, row-major
+        formats(list): A %-format per sample that writes the values with the precision they
+            were read with, or None for computed matrices
+    Methods:
+        __iter__: Return iterator of DiffExp objects, one per transcript
+        row: Return the values of one transcript
+        column: Return the values of one sample
+        filter: Return the transcripts whose value in a sample lies in a range
+        fold_change: Return the per-transcript ratio of two samples
+        log_transform: Return a log-transformed copy
     """
 
-    def __init__(self, diff_exp_filename):
+    def __init__(self, diff_exp_filename=None):
         self.diff_exp_filename = diff_exp_filename
+        self.samples = []
+        self.transcripts = []
+        self.index = {}
+        self.values = array("d")
+        self.formats = None
+        if diff_exp_filename is None:
+            return
+
         with open(diff_exp_filename) as diff_exp_file:
-            self.expressions = [DiffExp(info) for info in diff_exp_file]
+            header = diff_exp_file.readline().rstrip().split("\t")
+            self.samples = header[1:]
+            width = len(self.samples)
+            values = self.values
+            # Only the widest precision of each column is kept, not the text of every value.
+            decimals = [0] * width
+            digits = [1] * width
+            scientific = [False] * width
+            for line in diff_exp_file:
+                transcript, *row = line.rstrip().split("\t")
+                if len(row) != width:
+                    raise ValueError(
+                        f"{diff_exp_filename}: expected {width} values for {transcript}")
+                self.index[transcript] = len(self.transcripts)
+                self.transcripts.append(transcript)
+                for column, text in enumerate(row):
+                    value = parse_value(text)
+                    values.append(value)
+                    if math.isfinite(value):
+                        places, significant, exponent = value_precision(text)
+                        decimals[column] = max(decimals[column], places)
+                        digits[column] = max(digits[column], significant)
+                        scientific[column] = scientific[column] or exponent
+            self.formats = [f"%.{digits[column]}g" if scientific[column]
+                            else f"%.{decimals[column]}f" for column in range(width)]
+
+    @classmethod
+    def from_columns(cls, samples, transcripts, values, formats=None):
+        """Build a Matrix from sample names, transcript IDs and row-major float values
+
+        Args:
+            formats(list): A %-format per sample for writing values; None writes the shortest
+                round trip of each value
+        """
+
+        matrix = cls()
+        matrix.samples = list(samples)
+        matrix.transcripts = list(transcripts)
+        matrix.index = {transcript: row for row, transcript in enumerate(matrix.transcripts)}
+        matrix.values = array("d", values)
+        matrix.formats = list(formats) if formats is not None else None
+        if len(matrix.values) != len(matrix.transcripts) * len(matrix.samples):
+            raise ValueError("Number of values does not match transcripts x samples")
+        if matrix.formats is not None and len(matrix.formats) != len(matrix.samples):
+            raise ValueError("Number of formats does not match samples")
+        return matrix
 
     def __repr__(self):
         return f"Matrix({self.diff_exp_filename})"
 
+    def __len__(self):
+        return len(self.transcripts)
+
     def __iter__(self):
-        """Return iterator of the diff_exp input"""
+        """Return iterator of DiffExp objects, one per transcript, in file order"""
+
+        for transcript in self.transcripts:
+            yield DiffExp(transcript + "\t" + "\t".join(self.formatted_row(transcript)))
+
+    @property
+    def expressions(self):
+        """List of DiffExp objects, one per transcript; built on demand"""
+
+        return list(self)
+
+    def header(self):
+        """Return the header line fields: an empty transcript column and the sample names"""
+
+        return [""] + self.samples
+
+    def row(self, transcript):
+        """Return the values of `transcript` as a tuple of floats"""
+
+        width = len(self.samples)
+        start = self.index[transcript] * width
+        return tuple(self.values[start:start + width])
+
+    def formatted_row(self, transcript):
+        """Return the values of `transcript` as strings, with the precision of their column as read
+        or else the shortest round trip; values that were not numbers are written as NA"""
+
+        row = self.row(transcript)
+        if self.formats is None:
+            return tuple("NA" if math.isnan(value) else repr(value) for value in row)
+        return tuple("NA" if math.isnan(value) else form % value
+                     for form, value in zip(self.formats, row))
+
+    def column(self, sample):
+        """Return the values of `sample` (name or position) as a float64 array"""
+
+        if not isinstance(sample, int):
+            sample = self.samples.index(sample)
+        return self.values[sample::len(self.samples)]
+
+    def filter(self, sample, minimum=None, maximum=None):
+        """Return a Matrix with the transcripts whose value in `sample` is within the bounds
+
+        Args:
+            sample(str or int): Sample name or column position
+            minimum(float): Inclusive lower bound, or None
+            maximum(float): Inclusive upper bound, or None
+        """
+        lower = -math.inf if minimum is None else minimum
+        upper = math.inf if maximum is None else maximum
+        rows = [row for row, value in enumerate(self.column(sample))
+                if lower <= value <= upper]
+        return self.take(rows)
+
+    def take(self, rows):
+        """Return a Matrix with the given row numbers, in the given order"""
+
+        width = len(self.samples)
+        values = array("d")
+        for row in rows:
+            values.extend(self.values[row * width:(row + 1) * width])
+        return Matrix.from_columns(self.samples, [self.transcripts[row] for row in rows],
+                                   values, self.formats)
+
+    def fold_change(self, numerator, denominator, pseudocount=0.0, log_base=None):
+        """Return the per-transcript ratio of two samples as a float64 array
+
+        Args:
+            numerator(str or int): Sample name or column position
+            denominator(str or int): Sample name or column position
+            pseudocount(float): Added to both values before dividing
+            log_base(float): If given, return log fold changes in this base
+        """
+        ratios = array("d", [
+            (top + pseudocount) / (bottom + pseudocount) if bottom + pseudocount else math.inf
+            for top, bottom in zip(self.column(numerator), self.column(denominator))])
+        if log_base is None:
+            return ratios
+        return array("d", [math.log(ratio, log_base) if ratio else -math.inf
+                           for ratio in ratios])
+
+    def log_transform(self, base=2, pseudocount=1.0):
+        """Return a copy of the matrix with every value replaced by log(value + pseudocount)"""
 
-        return iter(self.expressions)
+        scale = 1 / math.log(base)
+        values = array("d", [math.log(value + pseudocount) * scale for value in self.values])
+        return Matrix.from_columns(self.samples, self.transcripts, values)
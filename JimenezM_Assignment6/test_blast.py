@@ -0,0 +1,11 @@
+from blast import BlastHit
+
+
+def test_blast_hit_columns_are_read_from_the_line():
+    line = "c0_g1_i1|m.1\tgi|74665200|sp|Q9HGP0.1|PVG4_SCHPO\t99.50\t372\t2\t1\t5\t376\t1\t372\t1e-30\t  754\n"
+    hit = BlastHit(line)
+    assert((hit.transcript_id, hit.sp_id, hit.pident) == ("c0_g1_i1", "Q9HGP0", 99.5))
+    assert((hit.qseqid, hit.length, hit.mismatch, hit.gapopen) == ("c0_g1_i1|m.1", 372, 2, 1))
+    assert((hit.qstart, hit.qend, hit.sstart, hit.send) == (5, 376, 1, 372))
+    assert((hit.evalue, hit.bitscore) == (1e-30, 754.0))
+    assert(not hasattr(hit, "__dict__") and hit.blast_hit == line)
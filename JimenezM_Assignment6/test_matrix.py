@@ -0,0 +1,11 @@
+from matrix import Matrix
+
+
+def test_matrix_iterates_values_as_read(tmp_path):
+    diff_exp = tmp_path / "test.matrix"
+    diff_exp.write_text("\tA\tB\tC\nt1\t1.5e-05\t4.00\tNA\nt2\t1234567\t16.8\t-0.001\n")
+    matrix = Matrix(str(diff_exp))
+    assert([info.transcript_info for info in matrix] == ["t1\t1.5e-05\t4.00\tNA",
+                                                         "t2\t1234567\t16.80\t-0.001"])
+    assert(matrix.column("B").tolist() == [4.0, 16.8])
+    assert([info.values for info in matrix.take([1])] == [("1234567", "16.80", "-0.001")])
@@ -0,0 +1,245 @@
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from diff_exp_annotations import (
+    create_columnar_report, create_report, go_enrichment, load_gaf, open_report, read_transcripts,
+    write_enrichment)
+from JimenezM_Assignment4 import GafFilter, cached_protein_to_go, load_ontology
+
+# BlastHit, the best-hit reducer and the matrix with transcript IDs replaced live with
+# Assignment 6.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                                "JimenezM_Assignment6"))
+from assignment6_annotation import write_columnar_output, write_id_output  # noqa: E402
+from blast import Blast, best_hits, parallel_best_hits  # noqa: E402
+
+
+class AnnotationPipeline:
+    """
+    Annotation of a differential expression matrix in stages: BLAST best hit -> protein -> GO
+    terms -> GO descriptions. Each stage builds one hash index up front; the matrix is then
+    streamed through the joins one line at a time, so no intermediate per-transcript lists are
+    built. Every stage is timed.
+
+    Args:
+        min_pident (float): Only BLAST hits with a percent identity above this are used
+        ranking (sequence): Ranking keys for the best hit (see blast.RANKING_KEYS); empty keeps
+            the first hit of each transcript that passes `min_pident`
+        gaf_filter (GafFilter): If given, only the GAF annotations that pass it are loaded
+        workers (int): Processes that parse the BLAST file; 1 parses it in this process and 0
+            uses one per CPU (see blast.parallel_best_hits)
+
+    Attributes:
+        transcript_to_protein (dictionary): Index built by load_blast
+        gene_to_go (mapping): Index built by load_annotations; None if not loaded
+        go_to_desc (dictionary): Index built by load_ontology; empty if not loaded
+        ontology (GoOntology): The ontology loaded by load_ontology; None if not loaded
+        timings (list): (stage, seconds, detail) tuples, in the order the stages ran
+    """
+
+    def __init__(self, min_pident=99, ranking=(), gaf_filter=None, workers=1):
+        self.min_pident = min_pident
+        self.ranking = tuple(ranking)
+        self.gaf_filter = gaf_filter
+        self.workers = workers
+        self.transcript_to_protein = {}
+        self.gene_to_go = None
+        self.go_to_desc = {}
+        self.ontology = None
+        self.timings = []
+
+    @contextmanager
+    def _stage(self, name):
+        """Time the enclosed block; the block may set the detail through the yielded list."""
+        detail = [""]
+        start = time.perf_counter()
+        yield detail
+        self.timings.append((name, time.perf_counter() - start, detail[0]))
+
+    def load_blast(self, blast_filename):
+        """Build the transcript -> protein index from a BLAST outfmt6 file."""
+        with self._stage("blast best hit") as detail:
+            if self.workers == 1:
+                hits = best_hits(Blast(blast_filename, streaming=True), self.ranking,
+                                 self.min_pident, grouped=False)
+            else:
+                hits = parallel_best_hits(blast_filename, self.workers or None, self.ranking,
+                                          self.min_pident)
+            self.transcript_to_protein = {transcript: hit.sp_id for transcript, hit in hits}
+            detail[0] = "%d transcripts" % len(self.transcript_to_protein)
+            if self.workers != 1:
+                detail[0] += ", %s workers" % (self.workers or "all")
+
+    def load_annotations(self, gene_to_go_filename):
+        """Build the protein -> GO index from a GAF file (through its binary cache)."""
+        with self._stage("protein -> GO") as detail:
+            if self.gaf_filter is None:
+                self.gene_to_go = cached_protein_to_go(gene_to_go_filename, load_gaf)
+                detail[0] = "%d proteins" % len(self.gene_to_go)
+            else:
+                # Each filter setting gets its own cache next to the GAF file.
+                self.gaf_filter.reset()
+                self.gene_to_go = cached_protein_to_go(gene_to_go_filename, self.gaf_filter.load,
+                                                       kind=self.gaf_filter.kind())
+                counts = self.gaf_filter.counts
+                if counts["lines"]:
+                    detail[0] = "%d proteins (%s)" % (len(self.gene_to_go), ", ".join(
+                        "%s %d" % item for item in counts.items()))
+                else:
+                    detail[0] = "%d proteins (filtered cache)" % len(self.gene_to_go)
+
+    def load_ontology(self, go_terms_filename):
+        """Build the GO -> description index from an OBO file (through its snapshot)."""
+        with self._stage("GO -> description") as detail:
+            self.ontology = load_ontology(go_terms_filename)
+            self.go_to_desc = self.ontology.names()
+            detail[0] = "%d terms" % len(self.go_to_desc)
+
+    def write_report(self, diff_exp_filename, output_filename, report_format="wide"):
+        """
+        Stream the matrix through the indexes and write the report.
+
+        Args:
+            diff_exp_filename (str): Path of the differential expression matrix
+            output_filename (str): Path of the report; .gz/.bz2/.xz/.zst output is compressed
+            report_format (str): "wide" or "tidy" as for create_report, or "ids", which writes
+                the matrix with each transcript replaced by its protein ID where one was found
+        """
+        with self._stage("report") as detail, \
+                open(diff_exp_filename, "r") as diff_exp_file, \
+                open_report(output_filename) as output_file:
+            if report_format == "ids":
+                write_id_output(diff_exp_file, self.transcript_to_protein, output_file)
+            else:
+                create_report(diff_exp_file, output_file, self.transcript_to_protein,
+                              self.gene_to_go or {}, self.go_to_desc, report_format)
+            detail[0] = output_filename
+
+    def write_columnar(self, diff_exp_filename, columnar_filename, report_format="wide"):
+        """Write the report in the binary columnar format (see write_columnar_report)."""
+        with self._stage("columnar report") as detail, \
+                open(diff_exp_filename, "r") as diff_exp_file:
+            if report_format == "ids":
+                write_columnar_output(diff_exp_file, self.transcript_to_protein, columnar_filename)
+            else:
+                create_columnar_report(diff_exp_file, columnar_filename, self.transcript_to_protein,
+                                       self.gene_to_go or {}, self.go_to_desc)
+            detail[0] = columnar_filename
+
+    def write_enrichment(self, diff_exp_filename, enrichment_filename):
+        """Test the matrix transcripts for GO term over-representation (see go_enrichment)."""
+        with self._stage("GO enrichment") as detail:
+            with open(diff_exp_filename, "r") as diff_exp_file:
+                study_transcripts = read_transcripts(diff_exp_file)
+            results = go_enrichment(study_transcripts, self.transcript_to_protein,
+                                    self.gene_to_go, self.ontology.closure())
+            with open(enrichment_filename, "w") as enrichment_file:
+                write_enrichment(results, enrichment_file, self.go_to_desc)
+            detail[0] = "%d terms tested" % len(results)
+
+    def print_timings(self, output_file=sys.stderr):
+        """Print how long every stage took."""
+        for name, seconds, detail in self.timings:
+            print("%-18s %8.3f s  %s" % (name, seconds, detail), file=output_file)
+        print("%-18s %8.3f s" % ("total", sum(seconds for name, seconds, detail in self.timings)),
+              file=output_file)
+
+
+def parse_values(value):
+    """Parse a comma-separated list of GAF column values."""
+    return [item.strip() for item in value.split(",")]
+
+
+def parse_ranking(value):
+    """Parse a comma-separated list of ranking keys; "first" means no ranking."""
+    if value == "first":
+        return ()
+    return tuple(key.strip() for key in value.split(",") if key.strip())
+
+
+def main(argv, defaults=None):
+    """
+    Run the annotation pipeline from the command line.
+
+    Args:
+        argv (list): Command line, including the program name
+        defaults (dictionary): Defaults for the command line options, e.g. the file names a
+            particular assignment uses
+    """
+    parser = argparse.ArgumentParser(
+        description="Annotate a differential expression matrix: BLAST best hit -> protein -> "
+                    "GO terms -> GO descriptions.")
+    parser.add_argument("--blast", help="BLAST tabular (outfmt6) results")
+    parser.add_argument("--matrix", help="differential expression matrix")
+    parser.add_argument("--gaf", help="GO annotations (GAF); without it no GO columns are added")
+    parser.add_argument("--obo", help="GO ontology (OBO), for GO descriptions and enrichment")
+    parser.add_argument("--output", help="report file (.gz/.bz2/.xz/.zst to compress)")
+    parser.add_argument("--format", choices=["wide", "tidy", "ids"], default="wide",
+                        help="report layout (default: wide)")
+    parser.add_argument("--columnar", metavar="FILE",
+                        help="also write the report in the binary columnar format to FILE")
+    parser.add_argument("--enrichment", metavar="FILE",
+                        help="write GO enrichment of the matrix transcripts to FILE")
+    parser.add_argument("--min-pident", type=float, default=99,
+                        help="only use BLAST hits with a higher percent identity (default: 99)")
+    parser.add_argument("--ranking", type=parse_ranking, default=(),
+                        help="comma-separated best-hit keys out of bitscore, evalue, pident, "
+                             "coverage, or 'first' for the first passing hit (default: first)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes that parse the BLAST file; 0 uses one per CPU "
+                             "(default: 1, no process pool)")
+    gaf_filters = parser.add_argument_group(
+        "GAF filters", "comma-separated values; lines are dropped while the GAF is read")
+    for option, values in (("qualifier", "qualifiers"), ("evidence", "evidence codes"),
+                           ("aspect", "aspects (P, F, C)"), ("taxon", "taxa")):
+        gaf_filters.add_argument("--" + option, type=parse_values, metavar="VALUES",
+                                 help="only keep annotations with one of these " + values)
+        gaf_filters.add_argument("--exclude-" + option, type=parse_values, metavar="VALUES",
+                                 help="drop annotations with one of these " + values)
+    if defaults:
+        parser.set_defaults(**defaults)
+    args = parser.parse_args(argv[1:])
+
+    for option in ("blast", "matrix", "output"):
+        if getattr(args, option) is None:
+            parser.error("--%s is required" % option)
+    if args.format != "ids" and args.gaf is None:
+        parser.error("--gaf is required for the %s format" % args.format)
+    if args.enrichment and (args.gaf is None or args.obo is None):
+        parser.error("--enrichment needs --gaf and --obo")
+
+    gaf_filter = None
+    filter_values = (args.qualifier, args.exclude_qualifier, args.evidence, args.exclude_evidence,
+                     args.aspect, args.exclude_aspect, args.taxon, args.exclude_taxon)
+    if any(values is not None for values in filter_values):
+        gaf_filter = GafFilter(*filter_values)
+
+    if args.workers < 0:
+        parser.error("--workers must be 0 or more")
+
+    pipeline = AnnotationPipeline(args.min_pident, args.ranking, gaf_filter, args.workers)
+    try:
+        pipeline.load_blast(args.blast)
+        if args.gaf is not None:
+            pipeline.load_annotations(args.gaf)
+        if args.obo is not None:
+            pipeline.load_ontology(args.obo)
+        if args.enrichment and not pipeline.go_to_desc:
+            # Every term would be missing from an empty ontology, so no enrichment is written.
+            sys.exit("GO enrichment needs GO terms, but none were loaded from: " + args.obo)
+        pipeline.write_report(args.matrix, args.output, args.format)
+        if args.columnar:
+            pipeline.write_columnar(args.matrix, args.columnar, args.format)
+        if args.enrichment:
+            pipeline.write_enrichment(args.matrix, args.enrichment)
+    except (OSError, ValueError) as error:
+        print("Failed to open input file: " + str(error))
+        return
+    pipeline.print_timings()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
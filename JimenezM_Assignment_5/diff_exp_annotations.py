@@ -1,4 +1,17 @@
-import re
+import bz2
+import gzip
+import json
+import lzma
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# The GO helpers live with Assignment 4, one directory up.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from JimenezM_Assignment4 import GoAnnotations, GoOntology  # noqa: E402
 
 
 def blast_parse(blast_file):
@@ -31,52 +44,68 @@ def process_gaf(gene_to_go_file):
     Args:
         gene_to_go_file (File): File object representing GAF file
     Returns:
-        dictionary containing object_id (keys) and a list of go_id (values)
+        GoAnnotations mapping containing object_id (keys) and a set of go_id (values)
     """
-    gene_to_go = {}
-    # Load protein IDs and corresponding GO terms to the dictionary.
+    gene_to_go = GoAnnotations()
+    # Load protein IDs and corresponding GO terms to the mapping.
     for line in gene_to_go_file:
         db, object_id, object_symbol, qualifier, go_id, * \
             others = line.split("\t")
 
         # Check if both protein and GO IDs have a value before adding.
         if object_id and go_id:
-            go_ids = gene_to_go.get(object_id, set())
-            go_ids.add(go_id)
-            gene_to_go[object_id] = go_ids
+            gene_to_go.add(object_id, go_id)
 
     return gene_to_go
 
 
-def process_go_terms(go_terms):
+def load_gaf(gene_to_go_filename):
     """
+    Open and process a GAF file; see process_gaf.
 
+    Args:
+        gene_to_go_filename (str): Path of the GAF file
+    Returns:
+        GoAnnotations mapping containing object_id (keys) and a set of go_id (values)
+    """
+    with open(gene_to_go_filename, "r") as gene_to_go_file:
+        return process_gaf(gene_to_go_file)
+
+
+def process_go_terms(go_terms):
+    """
     Args:
         go_terms (String): The unprocessed contents of a OBO file.
 
     Returns:
         dictionary containing go ID (keys) and go name (value)
     """
-    go_to_desc = {}
+    # Load GO IDs and their names to the dictionary; terms without an ID or a name are skipped.
+    return GoOntology.from_lines(go_terms.splitlines(True)).names()
 
-    # Load GO IDs and their names to the dictionary.
-    terms = re.findall(r"\[Term]\n(.*?)\n\n", go_terms, re.DOTALL)
 
-    for term in terms:
-        go_id = re.search(r"^id:\s+(GO:\d+?)\n", term)
-        go_name = re.search(r"^name:\s+(.+?)\n", term, re.M)
-
-        # Check if both ID and name have a value before adding.
-        if go_id and go_name:
-            go_to_desc[go_id.group(1)] = go_name.group(1)
+def format_go_lines(go_ids, go_to_desc):
+    """
+    Return the sorted "GO ID<TAB>description" fields for a set of GO IDs.
 
-    return go_to_desc
+    Args:
+        go_ids (set): GO IDs
+        go_to_desc (dictionary): Mapping from GO term to GO description
+    Returns:
+        list of strings, one per GO ID, sorted by GO ID
+    """
+    return [go_id + "\t" + go_to_desc.get(go_id, "NA") for go_id in sorted(go_ids)]
 
 
-def create_report(diff_exp_file, output_report_file, transcript_to_protein, gene_to_go, go_to_desc):
+def create_report(diff_exp_file, output_report_file, transcript_to_protein, gene_to_go, go_to_desc,
+                  report_format="wide", buffer_size=1 << 16):
     """
     Create a report in TSV format for each entry in the given differential expression file by annotating them with the
     corresponding protein ID, GO ID, and GO descriptions if they exist. The results are written to the File given in output_report_file.
+    Any number of sample columns is passed through, as given in the differential expression file.
+
+    The sorted GO lines of each protein are formatted once and reused for every transcript that maps to it, and output
+    is collected and written in batches with writelines.
 
     Args:
         diff_exp_file (File): File object representing a differential expression file
@@ -84,56 +113,496 @@ def create_report(diff_exp_file, output_report_file, transcript_to_protein, gene
         transcript_to_protein (dictionary): Mapping from transcript to protein ID
         gene_to_go (dictionary): Mapping from protein ID to a list of matching GO terms
         go_to_desc (dictionary): Mapping from GO term to GO description
+        report_format (str): "wide" writes the transcript columns once, followed by blank-padded GO lines;
+            "tidy" writes a header line and repeats the transcript columns on every GO line
+        buffer_size (int): Number of lines collected before they are written
     """
+    if report_format not in ("wide", "tidy"):
+        raise ValueError("report_format must be 'wide' or 'tidy', not %r" % report_format)
+    tidy = report_format == "tidy"
+
     # Loop through differential expression file; lookup the protein ID and
     # GO term + GO name; print results to REPORT output.
-    diff_exp_file.readline()  # skip header
+    header = diff_exp_file.readline()
+    if tidy:
+        samples = header.rstrip("\r\n").split("\t")[1:]
+        output_report_file.write("\t".join(["transcript", "protein", *samples, "go_id", "go_name"]) + "\n")
+
+    # protein -> (GO fields, first GO field, block of following lines); the block depends on the column count.
+    go_blocks = {}
+    width = None
+    lines = []
     for line in diff_exp_file:
-        transcript, sp_ds, sp_hs, sp_log, sp_plat = line.rstrip().split("\t")
+        transcript, *values = line.rstrip().split("\t")
+        if len(values) != width:
+            width = len(values)
+            padding = "\t" * (width + 2)
+            go_blocks.clear()
 
         protein = transcript_to_protein.get(transcript, "NA")
+        prefix = "\t".join([transcript, protein, *values]) + "\t"
         go_ids = gene_to_go.get(protein, None)
 
         if go_ids is None:
-            output_report_file.write("\t".join(
-                [transcript, protein, sp_ds, sp_hs, sp_log, sp_plat, "NA", "NA"]) + "\n")
+            lines.append(prefix + "NA\tNA\n")
         else:
-            first_line = True
-            for go_id in sorted(go_ids):
-                go_desc = go_to_desc.get(go_id, "NA")
-                if first_line:
-                    output_report_file.write("\t".join(
-                        [transcript, protein, sp_ds, sp_hs, sp_log, sp_plat, go_id, go_desc]) + "\n")
-                    first_line = False
-                else:
-                    output_report_file.write(
-                        "\t".join(['', '', '', '', '', '', go_id, go_desc]) + "\n")
-
-
-def main():
-    blast_filename = "blastp.outfmt6"
-    gene_to_go_filename = "gene_association_subset.gaf"
-    go_terms_filename = "go-basic.obo"
-    diff_exp_filename = "diffExpr.P1e-3_C2.matrix"
-    output_filename = "report.tsv"
-
-    # open all the files
+            try:
+                go_lines, first, rest = go_blocks[protein]
+            except KeyError:
+                go_lines = format_go_lines(go_ids, go_to_desc)
+                first = go_lines[0] + "\n" if go_lines else None
+                rest = "".join(padding + go_line + "\n" for go_line in go_lines[1:])
+                go_blocks[protein] = (go_lines, first, rest)
+            if tidy:
+                lines.extend(prefix + go_line + "\n" for go_line in go_lines)
+            elif first is not None:
+                lines.append(prefix + first)
+                lines.append(rest)
+
+        if len(lines) >= buffer_size:
+            output_report_file.writelines(lines)
+            lines = []
+    output_report_file.writelines(lines)
+
+
+def open_report(filename, compression=None):
+    """
+    Open a report file for writing text, optionally compressed.
+
+    Args:
+        filename (str): Path of the report
+        compression (str): None, "gzip", "bz2", "xz" or "zstd"; if None it is chosen from the
+            file extension (.gz, .bz2, .xz, .zst), and the file is uncompressed otherwise.
+            "zstd" needs Python 3.14's compression.zstd or the zstandard package.
+    Returns:
+        a writable text File object
+    """
+    if compression is None:
+        compression = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}.get(
+            os.path.splitext(filename)[1])
+    if compression is None:
+        return open(filename, "w")
+    if compression == "gzip":
+        return gzip.open(filename, "wt", compresslevel=6)
+    if compression == "bz2":
+        return bz2.open(filename, "wt")
+    if compression == "xz":
+        return lzma.open(filename, "wt")
+    if compression == "zstd":
+        try:
+            from compression import zstd
+            return zstd.open(filename, "wt")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd output needs Python 3.14 or the zstandard package") from None
+        return zstandard.open(filename, "wt")
+    raise ValueError("Unknown compression: %r" % compression)
+
+
+# Columnar report format: the magic bytes, a uint32 header length, a JSON header and the column
+# data. Each "dict" column is a UTF-8 string table (uint32 end offsets plus the bytes) followed
+# by one code per row, as uint8, uint16 or uint32 depending on the dictionary size; each
+# "float32" column is one float per row. Arrays are little-endian and each column starts
+# 4-byte aligned; the header records where every column starts.
+COLUMNAR_MAGIC = b"COLREP1\n"
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def write_columnar_report(filename, columns):
+    """
+    Write a table as a binary columnar file that read_columnar_report can load column by column.
+
+    Args:
+        filename (str): Path of the file to write
+        columns (list): (name, kind, values) tuples, where kind is "dict" for strings, which are
+            dictionary-encoded, or "float32" for numbers; all columns have the same length
+    """
+    lengths = {len(values) for name, kind, values in columns}
+    if len(lengths) > 1:
+        raise ValueError("All columns must have the same number of rows")
+    rows = lengths.pop() if lengths else 0
+
+    payloads = []
+    descriptions = []
+    for name, kind, values in columns:
+        if kind == "dict":
+            codes = {}
+            encoded = [codes.setdefault(value, len(codes)) for value in values]
+            typecode = "B" if len(codes) <= 0xFF else "H" if len(codes) <= 0xFFFF else "I"
+            encoded = _little_endian(array(typecode, encoded)).tobytes()
+            encoded += b"\0" * (-len(encoded) % 4)
+            offsets = array("I")
+            blob = bytearray()
+            for value in codes:
+                blob += value.encode()
+                offsets.append(len(blob))
+            blob += b"\0" * (-len(blob) % 4)
+            parts = [_little_endian(offsets).tobytes(), bytes(blob), encoded]
+            descriptions.append({"name": name, "kind": kind, "dictionary_size": len(codes),
+                                 "dictionary_bytes": len(blob), "code_type": typecode})
+        elif kind == "float32":
+            parts = [_little_endian(array("f", values)).tobytes()]
+            descriptions.append({"name": name, "kind": kind})
+        else:
+            raise ValueError("Unknown column kind: %r" % kind)
+        payloads.append(parts)
+
+    header = {"rows": rows, "columns": descriptions}
+    # Column offsets are relative to the start of the data, which follows the padded header, so
+    # they are known before the header is serialized and the header is written only once.
+    position = 0
+    for description, parts in zip(descriptions, payloads):
+        description["offset"] = position
+        position += sum(len(part) for part in parts)
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b" " * (-(len(COLUMNAR_MAGIC) + 4 + len(header_bytes)) % 4)
+
+    with open(filename, "wb") as output_file:
+        output_file.write(COLUMNAR_MAGIC)
+        output_file.write(struct.pack("<I", len(header_bytes)))
+        output_file.write(header_bytes)
+        for parts in payloads:
+            output_file.writelines(parts)
+
+
+class ColumnarReport:
+    """
+    Reader for files written by write_columnar_report. The file is memory-mapped and only the
+    columns that are asked for are decoded.
+
+    Args:
+        filename (str): Path of the columnar file
+    Attributes:
+        rows (int): Number of rows
+        columns (list): Column names, in file order
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as input_file:
+            self._map = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            self._map.close()
+            raise ValueError("Not a columnar report: " + filename)
+        start = len(COLUMNAR_MAGIC) + 4
+        (header_length,) = struct.unpack_from("<I", self._map, len(COLUMNAR_MAGIC))
+        header = json.loads(self._map[start:start + header_length])
+        self._data = start + header_length
+        self.rows = header["rows"]
+        self._descriptions = {column["name"]: column for column in header["columns"]}
+        self.columns = [column["name"] for column in header["columns"]]
+
+    def __repr__(self):
+        return "ColumnarReport(%s)" % self.filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def _array(self, typecode, position, count):
+        values = array(typecode)
+        values.frombytes(self._map[position:position + values.itemsize * count])
+        return _little_endian(values)
+
+    def codes(self, name):
+        """
+        Return a dictionary column as (dictionary of strings, unsigned integer array of codes),
+        without decoding every row.
+        """
+        description = self._descriptions[name]
+        if description["kind"] != "dict":
+            raise ValueError("Column %s is not dictionary-encoded" % name)
+        position = self._data + description["offset"]
+        size = description["dictionary_size"]
+        offsets = self._array("I", position, size)
+        position += 4 * size
+        # Offsets are UTF-8 byte offsets, so slice the bytes before decoding each entry.
+        dictionary = [self._map[position + begin:position + end].decode()
+                      for begin, end in zip([0] + offsets[:-1].tolist(), offsets)]
+        position += description["dictionary_bytes"]
+        return dictionary, self._array(description["code_type"], position, self.rows)
+
+    def column(self, name):
+        """
+        Return one column: a list of strings for dictionary columns, an array('f') otherwise.
+        """
+        description = self._descriptions[name]
+        if description["kind"] == "float32":
+            return self._array("f", self._data + description["offset"], self.rows)
+        dictionary, codes = self.codes(name)
+        return [dictionary[code] for code in codes]
+
+    def read(self, columns=None):
+        """
+        Return a dictionary of column name to column for `columns` (default: all).
+        """
+        return {name: self.column(name) for name in (columns or self.columns)}
+
+
+def read_columnar_report(filename, columns=None):
+    """
+    Load some or all columns of a file written by write_columnar_report.
+
+    Args:
+        filename (str): Path of the columnar file
+        columns (list): Names of the columns to load; None loads all of them
+    Returns:
+        dictionary of column name to a list of strings or an array('f') of floats
+    """
+    with ColumnarReport(filename) as report:
+        return report.read(columns)
+
+
+def _to_float(value):
     try:
-        blast_file = open(blast_filename, "r")
-        gene_to_go_file = open(gene_to_go_filename, "r")
-        go_terms_file = open(go_terms_filename, "r")
-        diff_exp_file = open(diff_exp_filename, "r")
-    except Exception as e:
-        print('Failed to open input file: ' + str(e))
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def create_columnar_report(diff_exp_file, filename, transcript_to_protein, gene_to_go, go_to_desc):
+    """
+    Write the annotation report of create_report as a columnar file with one row per transcript and
+    GO term (no blank continuation rows). Transcript, protein, GO ID and GO name columns are
+    dictionary-encoded and the sample columns are stored as float32.
+
+    Args:
+        diff_exp_file (File): File object representing a differential expression file
+        filename (str): Path of the columnar file to write
+        transcript_to_protein (dictionary): Mapping from transcript to protein ID
+        gene_to_go (dictionary): Mapping from protein ID to a list of matching GO terms
+        go_to_desc (dictionary): Mapping from GO term to GO description
+    """
+    samples = diff_exp_file.readline().rstrip("\r\n").split("\t")[1:]
+    transcripts, proteins, go_ids, go_names = [], [], [], []
+    sample_values = [array("f") for sample in samples]
+    go_lines = {}
+    for line in diff_exp_file:
+        transcript, *values = line.rstrip().split("\t")
+        values = [_to_float(value) for value in values]
+        protein = transcript_to_protein.get(transcript, "NA")
+        if protein not in go_lines:
+            terms = gene_to_go.get(protein, None)
+            go_lines[protein] = [("NA", "NA")] if terms is None else \
+                [(go_id, go_to_desc.get(go_id, "NA")) for go_id in sorted(terms)]
+        for go_id, go_name in go_lines[protein]:
+            transcripts.append(transcript)
+            proteins.append(protein)
+            go_ids.append(go_id)
+            go_names.append(go_name)
+            for column, value in zip(sample_values, values):
+                column.append(value)
+
+    write_columnar_report(filename, [("transcript", "dict", transcripts), ("protein", "dict", proteins)]
+                          + [(sample, "float32", column) for sample, column in zip(samples, sample_values)]
+                          + [("go_id", "dict", go_ids), ("go_name", "dict", go_names)])
+
+
+def read_transcripts(diff_exp_file):
+    """
+    Return the transcript IDs of a differential expression file, skipping the header.
+
+    Args:
+        diff_exp_file (File): File object representing a differential expression file
+    Returns:
+        list of transcript IDs, in file order
+    """
+    diff_exp_file.readline()  # skip header
+    return [line.split("\t", 1)[0] for line in diff_exp_file if line.strip()]
+
+
+def propagate_terms(proteins, gene_to_go, closure):
+    """
+    Return each protein's GO terms together with all of their is_a ancestors. Each protein is
+    propagated once, however many transcripts map to it.
+
+    Args:
+        proteins (iterable): Protein IDs
+        gene_to_go (dictionary): Mapping from protein ID to a set of GO IDs
+        closure (GoClosure): Precomputed is_a ancestors, e.g. load_ontology(...).closure()
+    Returns:
+        dictionary containing protein ID (keys) and a frozenset of GO IDs (values); proteins
+        without annotations are left out
+    """
+    propagated = {}
+    for protein in proteins:
+        if protein in propagated:
+            continue
+        go_ids = gene_to_go.get(protein)
+        if not go_ids:
+            continue
+        terms = set(go_ids)
+        for go_id in go_ids:
+            terms.update(closure.ancestors(go_id))
+        propagated[protein] = frozenset(terms)
+    return propagated
+
+
+def count_terms(transcripts, transcript_to_protein, protein_terms):
+    """
+    Count, for every GO term, the transcripts annotated to it (directly or through a descendant).
+
+    Args:
+        transcripts (iterable): Transcript IDs
+        transcript_to_protein (dictionary): Mapping from transcript to protein ID
+        protein_terms (dictionary): Mapping from protein ID to propagated GO IDs
+    Returns:
+        tuple (dictionary of GO ID to count, number of annotated transcripts)
+    """
+    counts = {}
+    annotated = 0
+    for transcript in transcripts:
+        terms = protein_terms.get(transcript_to_protein.get(transcript))
+        if terms is None:
+            continue
+        annotated += 1
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+    return counts, annotated
+
+
+def log_factorials(n):
+    """
+    Return a table of log(i!) for i = 0..n.
+    """
+    table = [0.0] * (n + 1)
+    for i in range(2, n + 1):
+        table[i] = table[i - 1] + math.log(i)
+    return table
+
+
+def hypergeometric_sf(k, population, successes, draws, log_factorial):
+    """
+    Return P(X >= k) for a hypergeometric variable: `draws` items drawn without replacement from
+    `population` items of which `successes` are annotated. This is the one-sided Fisher's exact
+    test for over-representation.
+
+    Args:
+        k (int): Number of annotated items drawn
+        population (int): Population size
+        successes (int): Number of annotated items in the population
+        draws (int): Number of items drawn
+        log_factorial (list): Table of log(i!) covering at least `population`
+    """
+    def log_choose(n, r):
+        return log_factorial[n] - log_factorial[r] - log_factorial[n - r]
+
+    log_total = log_choose(population, draws)
+    p_value = 0.0
+    for x in range(k, min(successes, draws) + 1):
+        p_value += math.exp(log_choose(successes, x)
+                            + log_choose(population - successes, draws - x) - log_total)
+    return min(p_value, 1.0)
+
+
+def benjamini_hochberg(p_values):
+    """
+    Return Benjamini-Hochberg adjusted p-values (q-values), in the order of `p_values`.
+    """
+    total = len(p_values)
+    order = sorted(range(total), key=p_values.__getitem__, reverse=True)
+    q_values = [0.0] * total
+    smallest = 1.0
+    for rank, i in zip(range(total, 0, -1), order):
+        smallest = min(smallest, p_values[i] * total / rank)
+        q_values[i] = smallest
+    return q_values
+
+
+def go_enrichment(study_transcripts, transcript_to_protein, gene_to_go, closure, min_count=1):
+    """
+    Test every GO term for over-representation among the study transcripts (e.g. the
+    differentially expressed ones) against all transcripts with a protein match. Annotations are
+    propagated up the is_a graph, and terms are tested with a hypergeometric test. Terms sharing
+    the same counts share one p-value computation.
+
+    Args:
+        study_transcripts (iterable): Transcript IDs of the study set
+        transcript_to_protein (dictionary): Mapping from transcript to protein ID; its keys are
+            the population
+        gene_to_go (dictionary): Mapping from protein ID to a set of GO IDs
+        closure (GoClosure): Precomputed is_a ancestors
+        min_count (int): Skip terms annotated to fewer study transcripts than this
+    Returns:
+        list of tuples (go_id, study_count, study_size, population_count, population_size,
+        p_value, q_value), sorted by p-value
+    """
+    study_transcripts = [transcript for transcript in dict.fromkeys(study_transcripts)
+                         if transcript in transcript_to_protein]
+    protein_terms = propagate_terms(transcript_to_protein.values(), gene_to_go, closure)
+    population_counts, population_size = count_terms(
+        transcript_to_protein, transcript_to_protein, protein_terms)
+    study_counts, study_size = count_terms(
+        study_transcripts, transcript_to_protein, protein_terms)
+
+    log_factorial = log_factorials(population_size)
+    tested = [(go_id, count, population_counts[go_id])
+              for go_id, count in study_counts.items() if count >= min_count]
+    p_value_cache = {}
+    p_values = []
+    for go_id, count, population_count in tested:
+        key = (count, population_count)
+        if key not in p_value_cache:
+            p_value_cache[key] = hypergeometric_sf(
+                count, population_size, population_count, study_size, log_factorial)
+        p_values.append(p_value_cache[key])
+    q_values = benjamini_hochberg(p_values)
+
+    results = [(go_id, count, study_size, population_count, population_size, p_value, q_value)
+               for (go_id, count, population_count), p_value, q_value
+               in zip(tested, p_values, q_values)]
+    results.sort(key=lambda result: (result[5], result[0]))
+    return results
+
+
+def write_enrichment(results, output_file, go_to_desc):
+    """
+    Write GO enrichment results as TSV with a header line.
+
+    Args:
+        results (list): Tuples as returned by go_enrichment
+        output_file (File): File object the table is written to
+        go_to_desc (dictionary): Mapping from GO term to GO description
+    """
+    output_file.write("\t".join(["go_id", "go_name", "study_count", "study_size",
+                                 "population_count", "population_size",
+                                 "p_value", "q_value"]) + "\n")
+    for go_id, count, study_size, population_count, population_size, p_value, q_value \
+            in results:
+        output_file.write("%s\t%s\t%d\t%d\t%d\t%d\t%.3g\t%.3g\n" % (
+            go_id, go_to_desc.get(go_id, "NA"), count, study_size, population_count,
+            population_size, p_value, q_value))
+
 
-    with open(output_filename, "w") as output_file:
-        transcript_to_protein = blast_parse(blast_file)
-        gene_to_go = process_gaf(gene_to_go_file)
-        go_to_desc = process_go_terms(go_terms_file.read())
+def main(argv):
+    # The stages live in annotation_pipeline, which imports this module.
+    from annotation_pipeline import main as run_pipeline
 
-        create_report(diff_exp_file, output_file,
-                      transcript_to_protein, gene_to_go, go_to_desc)
+    run_pipeline(argv, defaults={
+        "blast": "blastp.outfmt6",
+        "gaf": "gene_association_subset.gaf",
+        "obo": "go-basic.obo",
+        "matrix": "diffExpr.P1e-3_C2.matrix",
+        "output": "report.tsv",
+        "enrichment": "enrichment.tsv",
+        "min_pident": 99,
+        "ranking": (),
+    })
 
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv)
@@ -1,4 +1,11 @@
-from diff_exp_annotations import blast_parse, process_gaf, process_go_terms
+import io
+import math
+
+from diff_exp_annotations import blast_parse, process_gaf, process_go_terms, create_report, \
+    log_factorials, hypergeometric_sf, benjamini_hochberg, go_enrichment, \
+    create_columnar_report, read_columnar_report, write_columnar_report
+from JimenezM_Assignment4 import GoClosure
+from annotation_pipeline import AnnotationPipeline, main
 
 # Tests for blast_parse
 
@@ -73,6 +80,15 @@ def test_process_gaf_multiple_proteins():
                       "TEST_PROTEIN2": {"GO:9876"},
                       "TEST_PROTEIN3": {"GO:1234"}})
 
+
+def test_process_gaf_canonical_and_other_go_ids():
+    output = process_gaf(
+        ["UniProtKB	TEST_PROTEIN	SPBC460.03		GO:0005290	PMID:20944394	",
+         "UniProtKB	TEST_PROTEIN	SPBC460.03		GO:0000329	PMID:20944394	",
+         "UniProtKB	TEST_PROTEIN	SPBC460.03		GO:1234	PMID:20944394	"])
+    assert(output == {"TEST_PROTEIN": {"GO:0000329", "GO:0005290", "GO:1234"}})
+    assert(list(output.terms("TEST_PROTEIN")[:2]) == [329, 5290])
+
 # Tests for process_go_terms
 
 
@@ -153,3 +169,140 @@ is_a: GO:0048311 ! mitochondrion distribution
     assert(output == {"GO:12345": "mitochondrion inheritance",
                       "GO:67890": "some test name",
                       "GO:54321": "some other thing"})
+
+# Tests for create_report
+
+
+def test_create_report_four_samples():
+    diff_exp_file = io.StringIO(
+        "\tSp_ds\tSp_hs\tSp_log\tSp_plat\n"
+        "c1_g1_i1\t4.00\t0.07\t16.84\t26.37\n"
+        "c2_g1_i1\t1.00\t2.00\t3.00\t4.00\n")
+    output = io.StringIO()
+    create_report(diff_exp_file, output, {"c1_g1_i1": "P1"},
+                  {"P1": {"GO:2", "GO:1"}}, {"GO:1": "first"})
+    assert(output.getvalue() ==
+           "c1_g1_i1\tP1\t4.00\t0.07\t16.84\t26.37\tGO:1\tfirst\n"
+           "\t\t\t\t\t\tGO:2\tNA\n"
+           "c2_g1_i1\tNA\t1.00\t2.00\t3.00\t4.00\tNA\tNA\n")
+
+
+def test_create_report_any_number_of_samples():
+    diff_exp_file = io.StringIO("\tA\tB\nc1_g1_i1\t1.5\t2.5\n")
+    output = io.StringIO()
+    create_report(diff_exp_file, output, {"c1_g1_i1": "P1"},
+                  {"P1": {"GO:1", "GO:2"}}, {"GO:1": "first", "GO:2": "second"})
+    assert(output.getvalue() ==
+           "c1_g1_i1\tP1\t1.5\t2.5\tGO:1\tfirst\n"
+           "\t\t\t\tGO:2\tsecond\n")
+
+
+def test_create_report_tidy():
+    diff_exp_file = io.StringIO("\tA\tB\nc1_g1_i1\t1.5\t2.5\nc2_g1_i1\t3.5\t4.5\n")
+    output = io.StringIO()
+    create_report(diff_exp_file, output, {"c1_g1_i1": "P1"},
+                  {"P1": {"GO:2", "GO:1"}}, {"GO:1": "first"}, report_format="tidy")
+    assert(output.getvalue() ==
+           "transcript\tprotein\tA\tB\tgo_id\tgo_name\n"
+           "c1_g1_i1\tP1\t1.5\t2.5\tGO:1\tfirst\n"
+           "c1_g1_i1\tP1\t1.5\t2.5\tGO:2\tNA\n"
+           "c2_g1_i1\tNA\t3.5\t4.5\tNA\tNA\n")
+
+
+def test_create_columnar_report_round_trip(tmp_path):
+    diff_exp_file = io.StringIO("\tA\tB\nc1_g1_i1\t1.5\t2.5\nc2_g1_i1\t3.5\t4.5\n")
+    filename = str(tmp_path / "report.colrep")
+    create_columnar_report(diff_exp_file, filename, {"c1_g1_i1": "P1"},
+                           {"P1": {"GO:2", "GO:1"}}, {"GO:1": "first"})
+    output = read_columnar_report(filename)
+    assert(output["transcript"] == ["c1_g1_i1", "c1_g1_i1", "c2_g1_i1"])
+    assert(output["protein"] == ["P1", "P1", "NA"])
+    assert(list(output["A"]) == [1.5, 1.5, 3.5])
+    assert(list(output["B"]) == [2.5, 2.5, 4.5])
+    assert(output["go_id"] == ["GO:1", "GO:2", "NA"])
+    assert(output["go_name"] == ["first", "NA", "NA"])
+    assert(list(read_columnar_report(filename, ["B"])) == ["B"])
+
+
+def test_columnar_report_non_ascii_round_trip(tmp_path):
+    filename = str(tmp_path / "report.colrep")
+    write_columnar_report(filename, [("go_name", "dict", ["α-helix", "beta", "γ-x", "beta"])])
+    assert(read_columnar_report(filename)["go_name"] == ["α-helix", "beta", "γ-x", "beta"])
+
+
+# Tests for GO enrichment
+
+
+def test_hypergeometric_sf_matches_direct_sum():
+    population, successes, draws = 40, 12, 10
+    table = log_factorials(population)
+    for k in range(0, 11):
+        expected = sum(math.comb(successes, x) * math.comb(population - successes, draws - x)
+                       for x in range(k, draws + 1)) / math.comb(population, draws)
+        assert(math.isclose(hypergeometric_sf(k, population, successes, draws, table), expected))
+
+
+def test_benjamini_hochberg():
+    output = benjamini_hochberg([0.01, 0.04, 0.03, 0.5])
+    assert([round(q, 6) for q in output] == [0.04, 0.053333, 0.053333, 0.5])
+
+
+def test_go_enrichment_propagates_to_ancestors():
+    closure = GoClosure({"GO:2": ["GO:1"], "GO:3": ["GO:1"], "GO:1": []})
+    transcript_to_protein = {"t1": "P1", "t2": "P2", "t3": "P3", "t4": "P4"}
+    gene_to_go = {"P1": {"GO:2"}, "P2": {"GO:2"}, "P3": {"GO:3"}, "P4": {"GO:3"}}
+    output = go_enrichment(["t1", "t2", "missing"], transcript_to_protein, gene_to_go, closure)
+    by_term = {result[0]: result for result in output}
+    assert(by_term["GO:1"][1:5] == (2, 2, 4, 4))
+    assert(by_term["GO:1"][5] == 1.0)
+    assert(by_term["GO:2"][1:5] == (2, 2, 2, 4))
+    assert(math.isclose(by_term["GO:2"][5], 1 / 6))
+    assert("GO:3" not in by_term)
+
+
+# Tests for the annotation pipeline
+
+
+def test_pipeline_ids_format(tmp_path, capsys):
+    blast = tmp_path / "blast.outfmt6"
+    blast.write_text("c1_g1_i1|m.1\tsp|P1|A_HUMAN\t96.0\t10\t0\t0\t1\t10\t1\t10\t1e-5\t20\n"
+                     "c1_g1_i1|m.2\tsp|P2|B_HUMAN\t99.0\t10\t0\t0\t1\t10\t1\t10\t1e-9\t40\n"
+                     "c2_g1_i1|m.3\tsp|P3|C_HUMAN\t90.0\t10\t0\t0\t1\t10\t1\t10\t1e-9\t40\n")
+    matrix = tmp_path / "matrix"
+    matrix.write_text("\tA\tB\nc1_g1_i1\t1.5\t2.5\nc2_g1_i1\t3.5\t4.5\n")
+    output = tmp_path / "output.txt"
+    first = AnnotationPipeline(min_pident=95)
+    first.load_blast(str(blast))
+    assert(first.transcript_to_protein == {"c1_g1_i1": "P1"})
+    ranked = AnnotationPipeline(min_pident=95, ranking=("bitscore", "evalue"))
+    ranked.load_blast(str(blast))
+    pooled = AnnotationPipeline(min_pident=95, ranking=("bitscore", "evalue"), workers=2)
+    pooled.load_blast(str(blast))
+    assert(pooled.transcript_to_protein == ranked.transcript_to_protein)
+    ranked.write_report(str(matrix), str(output), report_format="ids")
+    assert(output.read_text() == "\tA\tB\nP2\t1.5\t2.5\nc2_g1_i1\t3.5\t4.5\n")
+    assert([stage for stage, seconds, detail in ranked.timings] == ["blast best hit", "report"])
+    matrix.write_text("\tA\tB\nc1_g1_i1\t1.5\t2.5\nc2_g1_i1\t3.5\n")
+    main(["annotation_pipeline.py", "--blast", str(blast), "--matrix", str(matrix),
+          "--output", str(output), "--format", "ids"])
+    assert(capsys.readouterr().out == "Failed to open input file: %s, line 3: expected 2 values "
+           "for c2_g1_i1\n" % matrix)
+
+
+def test_pipeline_enrichment_needs_ontology(tmp_path):
+    blast = tmp_path / "blast.outfmt6"
+    blast.write_text("c1_g1_i1|m.1\tsp|P1|A_HUMAN\t99.5\t10\t0\t0\t1\t10\t1\t10\t1e-9\t40\n")
+    gaf = tmp_path / "test.gaf"
+    gaf.write_text("UniProtKB\tP1\tA\tGO:1\tREF\tIDA\tP\n")
+    matrix = tmp_path / "matrix"
+    matrix.write_text("\tA\nc1_g1_i1\t1.5\n")
+    try:
+        main(["annotation_pipeline.py", "--blast", str(blast), "--gaf", str(gaf),
+              "--matrix", str(matrix), "--obo", str(tmp_path / "missing.obo"),
+              "--output", str(tmp_path / "report.tsv"),
+              "--enrichment", str(tmp_path / "enrichment.tsv")])
+        assert(False)
+    except SystemExit as error:
+        assert("missing.obo" in str(error.code))
+    assert(not (tmp_path / "report.tsv").exists())
+    assert(not (tmp_path / "enrichment.tsv").exists())
@@ -1,6 +1,12 @@
 # BINF6200 Assignment 1
 # Michelle Jimenez
 
+import argparse
+import math
+import multiprocessing
+import re
+import sys
+
 mrna = """
 GCGGCCCTGCGGTCCCCGGGCGGCAGCAGCGGCCGCCTAGTCCCGCGCCTCTCCGGGCTTACAGCCCCGC
 GGTCCCGCCGCCCCGGGGCCGCCACCTCTCGGGGCTCCCCCCAGTCCCCGCGCGCGCAAGATGGCTGACC
@@ -45,27 +51,101 @@ AAAAAA
 mrna = mrna.replace("\r", "").replace("\n", "")
 
 
+CODON_TABLE = {
+    'TTT': "F", 'TTC': "F", 'TTA': "L", 'TTG': "L", 'CTT': "L", 'CTC': "L",
+    'CTA': "L", 'CTG': "L", 'ATT': "I", 'ATC': "I", 'ATA': "I", 'ATG': "M",
+    'GTT': "V", 'GTC': "V", 'GTA': "V", 'GTG': "V", 'TCT': "S", 'TCC': "S",
+    'TCA': "S", 'TCG': "S", 'CCT': "P", 'CCC': "P", 'CCA': "P", 'CCG': "P",
+    'ACT': "T", 'ACC': "T", 'ACA': "T", 'ACG': "T", 'GCT': "A", 'GCC': "A",
+    'GCA': "A", 'GCG': "A", 'TAT': "Y", 'TAC': "Y", 'TAA': "-", 'TAG': "-",
+    'CAT': "H", 'CAC': "H", 'CAA': "Q", 'CAG': "Q", 'AAT': "N", 'AAC': "N",
+    'AAA': "K", 'AAG': "K", 'GAT': "D", 'GAC': "D", 'GAA': "E", 'GAG': "E",
+    'TGT': "C", 'TGC': "C", 'TGA': "-", 'TGG': "W", 'CGT': "R", 'CGC': "R",
+    'CGA': "R", 'CGG': "R", 'AGT': "S", 'AGC': "S", 'AGA': "R", 'AGG': "R",
+    'GGT': "G", 'GGC': "G", 'GGA': "G", 'GGG': "G",
+}
+
+# Complement of each nucleotide, used to build the reverse strand.
+COMPLEMENT = str.maketrans("ACGTUacgtu", "TGCAAtgcaa")
+
+
 def codon_lookup(codon):
     """Return the associating amino acid in the single-letter format.
 
     Args:
         codon (str): A 3-nt sequence.
     """
+    return CODON_TABLE.get(codon, "x")
+
+
+def reverse_complement(sequence):
+    """Return the reverse complement of a nucleotide sequence.
+
+    Args:
+        sequence (str): mRNA or DNA sequence
+
+    Returns:
+        str: reverse complement of the sequence
+    """
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def translate_frame(sequence, start):
+    """Translate every complete codon of a sequence starting at given index in one pass.
+
+    Unlike translate_sequence, this does not look for a start codon or stop at a stop codon;
+    stops are translated as "-" and unknown codons as "x".
+
+    Args:
+        sequence (str): mRNA sequence
+        start (int): Starting index
+
+    Returns:
+        str: translated frame, one amino acid per codon
+    """
+    get = CODON_TABLE.get
+    return "".join([get(sequence[i:i+3], "x")
+                    for i in range(start, len(sequence) - 2, 3)])
 
-    codon_table = {
-        'TTT': "F", 'TTC': "F", 'TTA': "L", 'TTG': "L", 'CTT': "L", 'CTC': "L",
-        'CTA': "L", 'CTG': "L", 'ATT': "I", 'ATC': "I", 'ATA': "I", 'ATG': "M",
-        'GTT': "V", 'GTC': "V", 'GTA': "V", 'GTG': "V", 'TCT': "S", 'TCC': "S",
-        'TCA': "S", 'TCG': "S", 'CCT': "P", 'CCC': "P", 'CCA': "P", 'CCG': "P",
-        'ACT': "T", 'ACC': "T", 'ACA': "T", 'ACG': "T", 'GCT': "A", 'GCC': "A",
-        'GCA': "A", 'GCG': "A", 'TAT': "Y", 'TAC': "Y", 'TAA': "-", 'TAG': "-",
-        'CAT': "H", 'CAC': "H", 'CAA': "Q", 'CAG': "Q", 'AAT': "N", 'AAC': "N",
-        'AAA': "K", 'AAG': "K", 'GAT': "D", 'GAC': "D", 'GAA': "E", 'GAG': "E",
-        'TGT': "C", 'TGC': "C", 'TGA': "-", 'TGG': "W", 'CGT': "R", 'CGC': "R",
-        'CGA': "R", 'CGG': "R", 'AGT': "S", 'AGC': "S", 'AGA': "R", 'AGG': "R",
-        'GGT': "G", 'GGC': "G", 'GGA': "G", 'GGG': "G",
-    }
-    return codon_table.get(codon, "x")
+
+def translate_six_frames(sequence):
+    """Translate the three forward and three reverse-complement frames of a sequence.
+
+    Args:
+        sequence (str): mRNA sequence
+
+    Returns:
+        list: six translated frames (str), in the order +1, +2, +3, -1, -2, -3
+    """
+    sequence = sequence.upper()
+    reverse = reverse_complement(sequence)
+    return [translate_frame(strand, start)
+            for strand in (sequence, reverse) for start in (0, 1, 2)]
+
+
+def first_protein(frame):
+    """Return the protein starting at the first "M" of a translated frame.
+
+    Args:
+        frame (str): translated frame, as returned by translate_frame
+
+    Returns:
+        str: protein up to (not including) the next stop or unknown codon, or "" if no "M" exists
+    """
+    begin = frame.find("M")
+    if begin < 0:
+        return ""
+    end = len(frame)
+    for stop in ("-", "x"):
+        position = frame.find(stop, begin)
+        if 0 <= position < end:
+            end = position
+    return frame[begin:end]
+
+
+# An ORF in a translated frame: a start codon followed by everything up to the next stop or
+# unknown codon (or the end of the frame).
+ORF_PATTERN = re.compile(r"M[^x-]*")
 
 
 #size = len(motif)
@@ -85,17 +165,7 @@ def translate_sequence(sequence, start):
     Returns:
         str: translated protein sequence
     """
-    protein = ""
-    for i in range(start, len(sequence), 3):
-        codon = sequence[i:i+3]
-        aa = codon_lookup(codon)
-        if not protein and aa != 'M':
-            continue
-        elif aa == "x" or aa == "-":
-            break
-        else:
-            protein += aa
-    return protein
+    return first_protein(translate_frame(sequence, start))
 
 
 def read_frames(sequence):
@@ -111,8 +181,9 @@ def read_frames(sequence):
     """
     CORRECT_LENGTH = 671
     correct_sequence = None
+    frames = translate_six_frames(sequence)
     for start in [0, 1, 2]:
-        protein = translate_sequence(sequence, start)
+        protein = first_protein(frames[start])
         length = len(protein)
         correct = length == CORRECT_LENGTH
         if correct:
@@ -127,18 +198,243 @@ def read_frames(sequence):
     return correct_sequence
 
 
-def calculate_molecular_weight(sequence):
+# Residue masses in daltons (amino acid minus one water), as (monoisotopic, average).
+RESIDUE_MASSES = {
+    'G': (57.02146, 57.0519), 'A': (71.03711, 71.0788), 'S': (87.03203, 87.0782),
+    'P': (97.05276, 97.1167), 'V': (99.06841, 99.1326), 'T': (101.04768, 101.1051),
+    'C': (103.00919, 103.1388), 'L': (113.08406, 113.1594), 'I': (113.08406, 113.1594),
+    'N': (114.04293, 114.1038), 'D': (115.02694, 115.0886), 'Q': (128.05858, 128.1307),
+    'K': (128.09496, 128.1741), 'E': (129.04259, 129.1155), 'M': (131.04049, 131.1926),
+    'H': (137.05891, 137.1411), 'F': (147.06841, 147.1766), 'R': (156.10111, 156.1875),
+    'Y': (163.06333, 163.1760), 'W': (186.07931, 186.2132), 'U': (150.95364, 150.0388),
+    'O': (237.14773, 237.3018),
+}
+WATER_MASS = (18.01056, 18.01528)
+
+MONOISOTOPIC_MASSES = [(aa, masses[0]) for aa, masses in RESIDUE_MASSES.items()]
+AVERAGE_MASSES = [(aa, masses[1]) for aa, masses in RESIDUE_MASSES.items()]
+# Deletes every residue with a known mass, leaving only the unknown ones.
+KNOWN_RESIDUES = str.maketrans("", "", "".join(RESIDUE_MASSES))
+
+MOLECULAR_WEIGHT_ERRORS = ("raise", "skip", "nan")
+
+
+def calculate_molecular_weight(sequence, monoisotopic=False, errors="raise"):
     """Calculates the molecular weight of the given protein sequence.
 
+    The residue masses already have one water removed per peptide bond, so the weight is
+    their sum plus a single water for the free termini.
+
     Args:
-        sequence (str): a protein sequence
+        sequence (str): a protein sequence; a trailing "*" or "-" stop is ignored
+        monoisotopic (bool): use monoisotopic instead of average masses
+        errors (str): what to do with residues without a known mass, such as the ambiguity
+            codes B, Z and X: "raise" a ValueError, "skip" them and weigh the known residues,
+            or return "nan"
 
     Returns:
         float: Molecular weight in kilodaltons
+
+    Raises:
+        ValueError: if the sequence contains a residue without a known mass and errors is
+            "raise", or errors is not one of MOLECULAR_WEIGHT_ERRORS
     """
-    return len(sequence) * 0.11
+    return calculate_molecular_weights((sequence,), monoisotopic, errors)[0]
+
+
+def calculate_molecular_weights(sequences, monoisotopic=False, errors="raise"):
+    """Calculates the molecular weights of many protein sequences.
+
+    Unknown residues are found with one str.translate pass and each residue of the mass table
+    is counted with str.count, so there is no per-character Python loop; the input is consumed
+    lazily and may be any iterable, such as a generator over a proteome FASTA file.
+
+    Args:
+        sequences (iterable): protein sequences (str)
+        monoisotopic (bool): use monoisotopic instead of average masses
+        errors (str): "raise", "skip" or "nan", as for calculate_molecular_weight; with "skip"
+            or "nan" one unknown residue does not stop the rest of the batch
+
+    Returns:
+        list: Molecular weights in kilodaltons, in input order
+
+    Raises:
+        ValueError: if a sequence contains a residue without a known mass and errors is
+            "raise", or errors is not one of MOLECULAR_WEIGHT_ERRORS
+    """
+    if errors not in MOLECULAR_WEIGHT_ERRORS:
+        raise ValueError("errors must be one of: " + ", ".join(MOLECULAR_WEIGHT_ERRORS))
+    masses = MONOISOTOPIC_MASSES if monoisotopic else AVERAGE_MASSES
+    water = WATER_MASS[0 if monoisotopic else 1]
+    weights = []
+    for sequence in sequences:
+        sequence = sequence.rstrip("*-").upper()
+        if not sequence:
+            weights.append(0.0)
+            continue
+        unknown = sequence.translate(KNOWN_RESIDUES)
+        if unknown and errors == "raise":
+            raise ValueError("Unknown residues in protein sequence: "
+                             + "".join(sorted(set(unknown))))
+        weight = water
+        for aa, mass in masses:
+            weight += sequence.count(aa) * mass
+        weights.append(math.nan if unknown and errors == "nan" else weight / 1000)
+    return weights
+
+
+def read_fasta(fasta_file):
+    """Read a multi-FASTA file one record at a time.
+
+    Args:
+        fasta_file (File): File object (or any iterable of lines) of a FASTA file
+
+    Yields:
+        tuple: (name, sequence), where name is the first word of the header line
+    """
+    name = None
+    chunks = []
+    for line in fasta_file:
+        line = line.rstrip()
+        if line.startswith(">"):
+            if name is not None:
+                yield name, "".join(chunks)
+            name = line[1:].split(None, 1)[0] if len(line) > 1 else ""
+            chunks = []
+        elif name is not None:
+            chunks.append(line)
+    if name is not None:
+        yield name, "".join(chunks)
+
+
+def find_orfs(sequence, min_length):
+    """Find all ORFs of at least `min_length` amino acids in the six frames of a sequence.
+
+    Within each frame an ORF starts at the first "M" after the previous stop codon and runs
+    up to the next stop codon, so the same stretch is never reported twice.
+
+    Args:
+        sequence (str): mRNA sequence
+        min_length (int): minimum protein length in amino acids
+
+    Returns:
+        list: tuples (strand, frame, start, end, protein), where strand is "+" or "-", frame is
+        1-3 and start/end are 0-based, end-exclusive coordinates on the forward strand that
+        cover the coding codons (without the stop codon)
+    """
+    orfs = []
+    size = len(sequence)
+    for index, frame in enumerate(translate_six_frames(sequence)):
+        offset = index % 3
+        strand = "+" if index < 3 else "-"
+        for match in ORF_PATTERN.finditer(frame):
+            protein = match.group()
+            if len(protein) < min_length:
+                continue
+            start = offset + 3 * match.start()
+            end = offset + 3 * match.end()
+            if strand == "-":
+                start, end = size - end, size - start
+            orfs.append((strand, offset + 1, start, end, protein))
+    return orfs
+
+
+def find_record_orfs(record, min_length):
+    """Return (name, ORFs) for a single (name, sequence) FASTA record; see find_orfs."""
+    name, sequence = record
+    return name, find_orfs(sequence, min_length)
+
+
+def _find_record_orfs_worker(args):
+    """Unpack the (record, min_length) pair sent to a pool worker"""
+    return find_record_orfs(*args)
+
+
+def find_fasta_orfs(fasta_file, min_length, workers=1, chunksize=256):
+    """Stream the ORFs of every record in a multi-FASTA file.
+
+    Records are read lazily. With more than one worker, chunks of `chunksize` records are
+    sent to a process pool; results are yielded in input order either way.
+
+    Args:
+        fasta_file (File): File object of a multi-FASTA transcriptome
+        min_length (int): minimum protein length in amino acids
+        workers (int): number of worker processes; 1 searches in this process
+        chunksize (int): number of records sent to a worker at a time
+
+    Yields:
+        tuple: (name, ORFs) per record, with ORFs as returned by find_orfs
+    """
+    jobs = ((record, min_length) for record in read_fasta(fasta_file))
+    if workers <= 1:
+        for job in jobs:
+            yield _find_record_orfs_worker(job)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(_find_record_orfs_worker, jobs, chunksize)
+
+
+def write_orfs(results, fasta_output=None, bed_output=None):
+    """Write ORFs as protein FASTA and/or BED6.
+
+    ORFs are named "<record>.p<N>", numbered per record. The BED score column holds the protein
+    length.
+
+    Args:
+        results (iterable): (name, ORFs) tuples, as yielded by find_fasta_orfs
+        fasta_output (File): File object for the protein FASTA, or None
+        bed_output (File): File object for the BED records, or None
+
+    Returns:
+        int: number of ORFs written
+    """
+    count = 0
+    for name, orfs in results:
+        for number, (strand, frame, start, end, protein) in enumerate(orfs, 1):
+            orf_name = "%s.p%d" % (name, number)
+            if fasta_output is not None:
+                fasta_output.write(">%s %s:%d-%d(%s) frame:%d length:%d\n%s\n" % (
+                    orf_name, name, start + 1, end, strand, frame, len(protein), protein))
+            if bed_output is not None:
+                bed_output.write("%s\t%d\t%d\t%s\t%d\t%s\n" % (
+                    name, start, end, orf_name, len(protein), strand))
+        count += len(orfs)
+    return count
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Translate the PKC Beta-1 mRNA, or find ORFs in a multi-FASTA file.")
+    parser.add_argument("input_fasta", nargs="?",
+                        help="multi-FASTA transcriptome; without it the PKC Beta-1 example runs")
+    parser.add_argument("--min-length", type=int, default=100,
+                        help="minimum ORF length in amino acids (default: 100)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (default: 1)")
+    parser.add_argument("--fasta", help="protein FASTA output file")
+    parser.add_argument("--bed", help="BED output file")
+    args = parser.parse_args(argv[1:])
+
+    if args.input_fasta is None:
+        protein_sequence = read_frames(mrna)
+        weight = calculate_molecular_weight(protein_sequence)
+        print("PKC Beta-1 molecular weight (kilodaltons): " + str(weight))
+        return
+
+    fasta_output = open(args.fasta, "w") if args.fasta else None
+    bed_output = open(args.bed, "w") if args.bed else None
+    if fasta_output is None and bed_output is None:
+        fasta_output = sys.stdout
+    try:
+        with open(args.input_fasta) as fasta_file:
+            write_orfs(find_fasta_orfs(fasta_file, args.min_length, args.workers),
+                       fasta_output, bed_output)
+    finally:
+        for output in (fasta_output, bed_output):
+            if output is not None and output is not sys.stdout:
+                output.close()
 
 
-protein_sequence = read_frames(mrna)
-weight = calculate_molecular_weight(protein_sequence)
-print("PKC Beta-1 molecular weight (kilodaltons): " + str(weight))
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,76 @@
+# Benchmark GO ontology loading
+#
+# Compares the two original OBO parsers (split_terms/parse_go_term from Assignment 4 and the
+# regex-based process_go_terms from Assignment 5) with a single GoOntology pass, and times
+# loading the pickled snapshot written by load_ontology.
+# Usage: python benchmark_go.py <go.obo>
+
+import os
+import re
+import sys
+import time
+
+from JimenezM_Assignment4 import GoOntology, load_ontology, parse_go_term, split_terms
+
+
+def legacy_parent_mapping(filename):
+    """The original build_direct_parent_mapping: split_terms followed by parse_go_term."""
+    go_dict = {}
+    for term in split_terms(filename):
+        (id, direct_parents) = parse_go_term(term)
+        go_dict[id] = direct_parents
+    return go_dict
+
+
+def legacy_names(filename):
+    """The original process_go_terms: read() plus a DOTALL findall and two searches per term."""
+    with open(filename) as go_terms_file:
+        go_terms = go_terms_file.read()
+    go_to_desc = {}
+    for term in re.findall(r"\[Term]\n(.*?)\n\n", go_terms, re.DOTALL):
+        go_id = re.search(r"^id:\s+(GO:\d+?)\n", term)
+        go_name = re.search(r"^name:\s+(.+?)\n", term, re.M)
+        if go_id and go_name:
+            go_to_desc[go_id.group(1)] = go_name.group(1)
+    return go_to_desc
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    try:
+        filename = argv[1]
+    except IndexError:
+        print('Arguments: <go.obo>')
+        return
+
+    go_dict, parents_time = timed(legacy_parent_mapping, filename)
+    go_to_desc, names_time = timed(legacy_names, filename)
+    ontology, ontology_time = timed(GoOntology.from_obo, filename)
+
+    print('%d terms' % len(ontology))
+    print('split_terms + parse_go_term: %.2f s' % parents_time)
+    print('process_go_terms (regex):    %.2f s' % names_time)
+    print('both legacy parsers:         %.2f s' % (parents_time + names_time))
+    print('GoOntology.from_obo:         %.2f s (%.1fx)' %
+          (ontology_time, (parents_time + names_time) / ontology_time))
+
+    # First call parses and writes the snapshot; the second one only reads it.
+    snapshot_filename = filename + '.pickle'
+    if os.path.exists(snapshot_filename):
+        os.remove(snapshot_filename)
+    cold, cold_time = timed(load_ontology, filename)
+    warm, warm_time = timed(load_ontology, filename)
+    print('load_ontology, cold:         %.2f s (parse, is_a closure, write snapshot)' % cold_time)
+    print('load_ontology, from snapshot: %.3f s' % warm_time)
+
+    print('parents identical:', ontology.parent_mapping() == go_dict)
+    print('names identical:  ', ontology.names() == go_to_desc)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
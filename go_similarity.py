@@ -0,0 +1,268 @@
+# GO semantic similarity
+#
+# Information content of every GO term from annotation frequencies propagated up the is_a graph,
+# and Resnik, Lin and best-match-average protein similarity built on it.
+# Usage: python go_similarity.py <go.obo> <annotations.gaf> [<proteins.txt>] [--measure lin]
+
+import argparse
+import math
+import sys
+from array import array
+
+from JimenezM_Assignment4 import cached_protein_to_go, load_ontology
+
+
+class GoSimilarity:
+    """
+    Semantic similarity of GO terms and proteins. The information content (IC) of a term is
+    -log(p), where p is the fraction of the proteins annotated within its namespace that are
+    annotated to the term or one of its descendants. Every term keeps its ancestors, itself
+    included, as an integer array sorted by decreasing IC, so the most informative common ancestor
+    (MICA) of two terms is the first entry of one array that is in the other's ancestor set.
+
+    Args:
+        closure(GoClosure): The is_a closure of the ontology.
+        protein_to_go(mapping): Protein ID to GO IDs, as returned by map_protein_to_go.
+
+    Attributes:
+        closure(GoClosure): The is_a closure; its `go_ids` are the term indices used here.
+        counts(array): Number of proteins annotated to each term or its descendants.
+        ic(array): Information content of each term; 0 for terms no protein is annotated to.
+    """
+
+    measures = ('resnik', 'lin')
+
+    def __init__(self, closure, protein_to_go):
+        self.closure = closure
+        self.protein_to_go = protein_to_go
+        size = len(closure.go_ids)
+        all_ancestors = closure._ancestors
+
+        counts = array('L', bytes(array('L').itemsize * size))
+        for protein in protein_to_go:
+            indices, unknown = closure.propagate(protein_to_go[protein])
+            for i in indices:
+                counts[i] += 1
+        self.counts = counts
+
+        # Normalise by the root of each term's namespace rather than by all proteins, so the
+        # three roots all have an IC of 0.
+        self.ic = array('d', bytes(8 * size))
+        for i in range(size):
+            if counts[i]:
+                roots = [a for a in all_ancestors[i] if not all_ancestors[a]] or [i]
+                self.ic[i] = -math.log(counts[i] / max(counts[root] for root in roots))
+
+        # Ancestor arrays are only built for terms that are actually compared.
+        self._by_ic = {}
+        self._ancestor_sets = {}
+        self._mica = {}
+
+    def __repr__(self):
+        return f"GoSimilarity({len(self.ic)} terms, {len(self.protein_to_go)} proteins)"
+
+    def _ancestors(self, i):
+        """Return the ancestors of term `i`, itself included, by decreasing IC and as a set."""
+        try:
+            return self._by_ic[i], self._ancestor_sets[i]
+        except KeyError:
+            ancestors = list(self.closure._ancestors[i])
+            ancestors.append(i)
+            ancestors.sort(key=self.ic.__getitem__, reverse=True)
+            self._by_ic[i] = array('I', ancestors)
+            self._ancestor_sets[i] = frozenset(ancestors)
+            return self._by_ic[i], self._ancestor_sets[i]
+
+    def term_indices(self, go_ids):
+        """Return the indices of the GO IDs that are in the ontology, skipping the others."""
+        index = self.closure.index
+        return sorted({index[go_id] for go_id in go_ids if go_id in index})
+
+    def mica(self, a, b):
+        """
+        Return the IC of the most informative common ancestor of two terms.
+
+        Arguments:
+            a(int): Term index.
+            b(int): Term index.
+
+        Returns:
+            The IC (float); 0 if the terms share no ancestor, e.g. different namespaces.
+        """
+        if a > b:
+            a, b = b, a
+        key = a * len(self.ic) + b
+        try:
+            return self._mica[key]
+        except KeyError:
+            pass
+        ancestors = self._ancestors(b)[1]
+        value = 0.0
+        for ancestor in self._ancestors(a)[0]:
+            if ancestor in ancestors:
+                value = self.ic[ancestor]
+                break
+        self._mica[key] = value
+        return value
+
+    def namespace(self, i):
+        """Return the index of the root of term `i`'s namespace; a root is its own namespace."""
+        all_ancestors = self.closure._ancestors
+        for ancestor in all_ancestors[i]:
+            if not all_ancestors[ancestor]:
+                return ancestor
+        return i
+
+    def similarities(self, term, descendants, measure='resnik'):
+        """
+        Return the similarity of a term to every annotated term it shares an informative
+        ancestor with. The term's ancestors are walked by decreasing IC, so the first ancestor
+        that reaches an annotated term is their MICA; only pairs with a non-zero MICA are stored.
+
+        Arguments:
+            term(int): Term index.
+            descendants(dict): Maps each ancestor of the annotated terms to the set of annotated
+                terms below it, itself included, as built by similarity_matrix.
+            measure(str): 'resnik' or 'lin'.
+
+        Returns:
+            A dictionary of annotated term index -> similarity; missing terms score 0.
+        """
+        ic = self.ic
+        values = {}
+        # The annotated terms of the namespace whose MICA with `term` is not known yet.
+        remaining = set(descendants.get(self.namespace(term), ()))
+        for ancestor in self._ancestors(term)[0]:
+            value = ic[ancestor]
+            if not value or not remaining:
+                break
+            below = descendants.get(ancestor)
+            if below:
+                below = remaining.intersection(below)
+                remaining -= below
+                values.update(dict.fromkeys(below, value))
+        if measure == 'lin':
+            term_ic = ic[term]
+            for other, value in values.items():
+                values[other] = 2 * value / (term_ic + ic[other])
+        return values
+
+    def resnik(self, a, b):
+        """Return the Resnik similarity of two term indices: the IC of their MICA."""
+        return self.mica(a, b)
+
+    def lin(self, a, b):
+        """Return the Lin similarity of two term indices: 2 IC(MICA) / (IC(a) + IC(b))."""
+        total = self.ic[a] + self.ic[b]
+        if not total:
+            return 0.0
+        return 2 * self.mica(a, b) / total
+
+    def best_match_average(self, terms_a, terms_b, measure='resnik'):
+        """
+        Return the best-match-average similarity of two sets of term indices: the mean over both
+        sets of each term's best match in the other set.
+
+        Arguments:
+            terms_a(sequence): Term indices, e.g. from term_indices.
+            terms_b(sequence): Term indices.
+            measure(str): 'resnik' or 'lin'.
+
+        Returns:
+            The similarity (float); 0 if either set is empty.
+        """
+        if not terms_a or not terms_b:
+            return 0.0
+        similarity = getattr(self, measure)
+        scores = [[similarity(a, b) for b in terms_b] for a in terms_a]
+        best_a = sum(max(row) for row in scores)
+        best_b = sum(max(column) for column in zip(*scores))
+        return (best_a / len(terms_a) + best_b / len(terms_b)) / 2
+
+    def protein_similarity(self, protein_a, protein_b, measure='resnik'):
+        """Return the best-match-average similarity of two proteins' direct annotations."""
+        return self.best_match_average(self.term_indices(self.protein_to_go.get(protein_a, ())),
+                                       self.term_indices(self.protein_to_go.get(protein_b, ())),
+                                       measure)
+
+    def similarity_matrix(self, proteins, measure='resnik'):
+        """
+        Return the symmetric best-match-average similarity matrix of a list of proteins. Terms
+        are only compared within their namespace, and only with the terms the proteins are
+        annotated to: each protein's row holds the mean best match of its terms in every other
+        protein, and a pair's similarity is the mean of the two rows' entries.
+
+        Arguments:
+            proteins(list of str): Protein IDs.
+            measure(str): 'resnik' or 'lin'.
+
+        Returns:
+            A list with one array('d') row per protein.
+
+        Raises:
+            ValueError: If `measure` is not one of GoSimilarity.measures.
+        """
+        if measure not in self.measures:
+            raise ValueError('Unknown similarity measure: ' + measure)
+        terms = [self.term_indices(self.protein_to_go.get(protein, ())) for protein in proteins]
+        namespaces = {term: self.namespace(term) for term in set().union(*terms)}
+        descendants = {}
+        for term in namespaces:
+            for ancestor in self._ancestors(term)[0]:
+                descendants.setdefault(ancestor, set()).add(term)
+        by_namespace = []
+        for protein_terms in terms:
+            groups = {}
+            for term in protein_terms:
+                groups.setdefault(namespaces[term], []).append(term)
+            by_namespace.append(groups)
+
+        rows = []
+        for protein_terms in terms:
+            best = array('d', bytes(8 * len(proteins)))
+            for term in protein_terms:
+                values = self.similarities(term, descendants, measure)
+                namespace = namespaces[term]
+                for j, groups in enumerate(by_namespace):
+                    others = groups.get(namespace)
+                    if others:
+                        best[j] += max([values.get(other, 0.0) for other in others])
+            if protein_terms:
+                best = array('d', [value / len(protein_terms) for value in best])
+            rows.append(best)
+
+        for i, row in enumerate(rows):
+            for j in range(i + 1, len(rows)):
+                row[j] = rows[j][i] = (row[j] + rows[j][i]) / 2
+        return rows
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Protein GO semantic similarity matrix.')
+    parser.add_argument('input_terms', help='GO ontology (OBO)')
+    parser.add_argument('input_annotations', help='GO annotations (GAF)')
+    parser.add_argument('proteins', nargs='?',
+                        help='file with one protein ID per line (default: every annotated protein)')
+    parser.add_argument('--measure', choices=GoSimilarity.measures, default='resnik')
+    args = parser.parse_args(argv[1:])
+
+    protein_to_go = cached_protein_to_go(args.input_annotations)
+    similarity = GoSimilarity(load_ontology(args.input_terms).closure(), protein_to_go)
+    if args.proteins is None:
+        proteins = sorted(protein_to_go)
+    else:
+        try:
+            with open(args.proteins) as proteins_file:
+                proteins = [line.strip() for line in proteins_file if line.strip()]
+        except OSError:
+            print('Failed to open proteins file: ' + args.proteins)
+            return
+
+    lines = ['\t' + '\t'.join(proteins) + '\n']
+    for protein, row in zip(proteins, similarity.similarity_matrix(proteins, args.measure)):
+        lines.append(protein + '\t' + '\t'.join('%.4f' % value for value in row) + '\n')
+    sys.stdout.writelines(lines)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,156 @@
+# GO slim mapping
+#
+# Collapses GO annotations to the terms of a GO slim (e.g. goslim_generic.obo): every annotation
+# is replaced by its nearest ancestors over is_a and part_of, as map2slim does, that are in the
+# slim, and the proteins of each slim term are counted.
+# Usage: python go_slim.py <go.obo> <goslim.obo> <annotations.gaf> [--mapping <output.tsv>]
+#        [--is-a-only]
+
+import argparse
+import sys
+from array import array
+
+from JimenezM_Assignment4 import GoClosure, GoOntology, cached_protein_to_go, load_ontology
+
+
+class GoSlim:
+    """
+    Dense term -> slim lookup table. For every term of the full ontology the nearest slim
+    ancestors (the term itself if it is in the slim) are precomputed once, so remapping an
+    annotation is a dictionary lookup and a table lookup instead of an ancestor walk. Ancestors
+    are followed over is_a and part_of, like map2slim, so e.g. a component that is part_of a
+    slim term maps to it.
+
+    Args:
+        ontology(GoOntology): The full ontology.
+        slim_ids(iterable): GO IDs of the slim terms; secondary IDs are resolved.
+        part_of(bool): Follow part_of as well as is_a; False uses the is_a closure only.
+
+    Attributes:
+        slim_ids(list of str): The slim terms that are in the ontology, sorted; slim indices
+            refer to this list.
+        index(dict): Maps every GO ID of the ontology, secondary IDs included, to its term index.
+    """
+
+    def __init__(self, ontology, slim_ids, part_of=True):
+        if part_of:
+            closure = GoClosure(ontology.parent_mapping(part_of=True))
+        else:
+            closure = ontology.closure()
+        all_ancestors = closure._ancestors
+        self.slim_ids = sorted({ontology.resolve(go_id) for go_id in slim_ids} &
+                               set(closure.index))
+        slim_index = {closure.index[go_id]: i for i, go_id in enumerate(self.slim_ids)}
+
+        self.index = dict(closure.index)
+        for alt_id, go_id in ontology.alt_ids.items():
+            if go_id in closure.index:
+                self.index.setdefault(alt_id, closure.index[go_id])
+
+        # A slim ancestor is nearest unless it is also an ancestor of another slim ancestor.
+        self._table = []
+        slim_ancestors = {}
+        for term, ancestors in enumerate(all_ancestors):
+            candidates = [ancestor for ancestor in ancestors if ancestor in slim_index]
+            if term in slim_index:
+                nearest = (slim_index[term],)
+            elif len(candidates) < 2:
+                nearest = tuple(slim_index[ancestor] for ancestor in candidates)
+            else:
+                covered = set()
+                for candidate in candidates:
+                    if candidate not in slim_ancestors:
+                        slim_ancestors[candidate] = set(all_ancestors[candidate])
+                    covered |= slim_ancestors[candidate]
+                nearest = tuple(sorted(slim_index[candidate] for candidate in candidates
+                                       if candidate not in covered))
+            self._table.append(nearest)
+
+    def __repr__(self):
+        return f"GoSlim({len(self.slim_ids)} slim terms, {len(self._table)} terms)"
+
+    def slim_indices(self, go_ids):
+        """Return the set of slim indices the GO IDs map to; unknown GO IDs map to nothing."""
+        index = self.index
+        table = self._table
+        slims = set()
+        for go_id in go_ids:
+            term = index.get(go_id)
+            if term is not None:
+                slims.update(table[term])
+        return slims
+
+    def map_term(self, go_id):
+        """Return the sorted nearest slim GO IDs of a single GO ID."""
+        return [self.slim_ids[i] for i in sorted(self.slim_indices((go_id,)))]
+
+    def remap(self, protein_to_go):
+        """
+        Remap every protein's annotations to the slim.
+
+        Arguments:
+            protein_to_go(mapping): Protein ID to GO IDs, as returned by map_protein_to_go.
+
+        Yields:
+            (protein, slim GO IDs) tuples in protein order; proteins with no slim term are skipped.
+        """
+        slim_ids = self.slim_ids
+        for protein in sorted(protein_to_go):
+            slims = self.slim_indices(protein_to_go[protein])
+            if slims:
+                yield protein, [slim_ids[i] for i in sorted(slims)]
+
+    def counts(self, protein_to_go):
+        """
+        Count the proteins mapped to each slim term, in a single pass over the annotations.
+
+        Arguments:
+            protein_to_go(mapping): Protein ID to GO IDs, as returned by map_protein_to_go.
+
+        Returns:
+            An array with the number of proteins of each slim index and the number of proteins
+            that map to no slim term.
+        """
+        counts = array('L', bytes(array('L').itemsize * len(self.slim_ids)))
+        unmapped = 0
+        for protein in protein_to_go:
+            slims = self.slim_indices(protein_to_go[protein])
+            if not slims:
+                unmapped += 1
+            for i in slims:
+                counts[i] += 1
+        return counts, unmapped
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Map GO annotations to a GO slim and count the '
+                                                 'proteins of every slim term.')
+    parser.add_argument('input_terms', help='GO ontology (OBO)')
+    parser.add_argument('slim_terms', help='GO slim (OBO)')
+    parser.add_argument('input_annotations', help='GO annotations (GAF)')
+    parser.add_argument('--mapping', metavar='FILE',
+                        help="also write each protein's slim terms to FILE, one line per protein")
+    parser.add_argument('--is-a-only', action='store_true',
+                        help='only follow is_a to the slim terms; by default part_of is followed '
+                             'too, as map2slim does')
+    args = parser.parse_args(argv[1:])
+
+    ontology = load_ontology(args.input_terms)
+    slim = GoSlim(ontology, GoOntology.from_obo(args.slim_terms), part_of=not args.is_a_only)
+    protein_to_go = cached_protein_to_go(args.input_annotations)
+
+    counts, unmapped = slim.counts(protein_to_go)
+    names = ontology.names()
+    lines = ['%s\t%s\t%d\n' % (go_id, names.get(go_id, 'NA'), counts[i])
+             for i, go_id in sorted(enumerate(slim.slim_ids), key=lambda item: -counts[item[0]])]
+    lines.append('unmapped\tNA\t%d\n' % unmapped)
+    sys.stdout.writelines(lines)
+
+    if args.mapping:
+        with open(args.mapping, 'w') as mapping_file:
+            mapping_file.writelines('\t'.join([protein] + slims) + '\n'
+                                    for protein, slims in slim.remap(protein_to_go))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
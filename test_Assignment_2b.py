@@ -0,0 +1,45 @@
+import math
+import random
+import statistics
+
+from Assignment_2b import QuantileSketch, RunningStats
+
+
+# Tests for RunningStats and QuantileSketch
+
+
+def test_running_stats_matches_statistics():
+    numbers = [3.0, 1.0, 2.0, 5.0]
+    stats = RunningStats(numbers)
+    assert(stats.count == 4 and stats.minimum == 1.0 and stats.maximum == 5.0)
+    assert(math.isclose(stats.mean, statistics.fmean(numbers)))
+    assert(math.isclose(stats.variance(), statistics.variance(numbers)))
+    assert(math.isclose(stats.std_dev(), statistics.stdev(numbers)))
+    assert(stats.median() == statistics.median(numbers))
+    assert(RunningStats([4.0]).variance() is None and RunningStats().median() is None)
+
+
+def test_running_stats_merges_partial_streams():
+    random.seed(7)
+    numbers = [random.gauss(10, 3) for _ in range(20000)]
+    merged = RunningStats(numbers[:7000]).merge(RunningStats(numbers[7000:]))
+    assert(merged.count == len(numbers))
+    assert(merged.minimum == min(numbers) and merged.maximum == max(numbers))
+    assert(math.isclose(merged.mean, statistics.fmean(numbers)))
+    assert(math.isclose(merged.variance(), statistics.variance(numbers)))
+    assert(math.isclose(merged.std_dev(), statistics.stdev(numbers)))
+    assert(abs(merged.median() - statistics.median(numbers)) < 0.05)
+    for q, exact in zip([i / 10 for i in range(1, 10)], statistics.quantiles(numbers, n=10)):
+        assert(abs(merged.quantile(q) - exact) < 0.05)
+
+
+def test_quantile_sketch_memory_is_bounded():
+    sketch = QuantileSketch(compression=50)
+    for value in range(100000):
+        sketch.add(float(value))
+    assert(sketch.quantile(0) == 0.0 and sketch.quantile(1) == 99999.0)
+    assert(abs(sketch.median() - statistics.median(range(100000))) < 500)
+    assert(len(sketch._centroids) <= 50 and len(sketch._buffer) < 250)
+    half = QuantileSketch(compression=50)
+    half.merge(sketch)
+    assert(len(half) == 100000 and half.median() == sketch.median())
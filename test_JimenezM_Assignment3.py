@@ -0,0 +1,83 @@
+import io
+
+from JimenezM_Assignment3 import GBI_HEADER, GenBankIndex, build_index, convert_accessions, \
+    format_fasta, iter_records
+
+
+def genbank_record(version, definition, sequence):
+    lines = ["LOCUS       %s\n" % version.split(".")[0], "DEFINITION  %s.\n" % definition]
+    if version:
+        lines.append("VERSION     %s\n" % version)
+    lines.append("ORIGIN      \n")
+    lines.append("        1 %s\n" % sequence)
+    lines.append("//\n")
+    return "".join(lines)
+
+
+# Tests for iter_records and format_fasta
+
+
+def test_iter_records_multiple_entries():
+    records = [genbank_record("A1.1", "First", "acgt"), genbank_record("B2.1", "Second", "ggcc")]
+    genbank = io.StringIO("".join(records) + "LOCUS       C3\n")
+    assert(list(iter_records(genbank)) == records)
+    assert(list(iter_records(io.StringIO(""))) == [])
+
+
+def test_format_fasta_missing_origin():
+    record = "LOCUS       A1\nDEFINITION  No sequence.\nVERSION     A1.1\n//\n"
+    assert(format_fasta(record) == ">A1.1 No sequence\n\n\n")
+
+
+def test_format_fasta_wraps_at_70():
+    sequence = "acgtacgtac" * 15
+    record = "DEFINITION  Long record.\nVERSION     L1.1\nORIGIN\n" + "".join(
+        "%9d %s\n" % (start + 1, " ".join(sequence[i:i + 10] for i in range(start, start + 60, 10)))
+        for start in range(0, len(sequence), 60)) + "//\n"
+    lines = format_fasta(record).split("\n")
+    assert(lines[0] == ">L1.1 Long record")
+    assert([len(line) for line in lines[1:]] == [70, 70, 10, 0, 0])
+    assert("".join(lines[1:]) == sequence.upper())
+
+
+# Tests for build_index and GenBankIndex
+
+
+def test_genbank_index_lookup(tmp_path):
+    genbank = tmp_path / "test.gb"
+    records = [genbank_record("B2.1", "Second", "acgt"), genbank_record("A1.1", "First", "ggcc"),
+               genbank_record("", "No version", "tttt"), genbank_record("A1.2", "Again", "aatt"),
+               genbank_record("C3.1", "Third", "cccc")]
+    genbank.write_text("".join(records))
+    index_filename = build_index(str(genbank))
+    with open(index_filename) as index_file:
+        assert([line.split("\t")[1] for line in index_file][1:] == ["A1.1", "A1.2", "B2.1", "C3.1"])
+
+    with GenBankIndex(str(genbank)) as index:
+        assert(index.get_record("B2.1") == records[0])
+        assert(index.get_record("A1") == records[1])
+        assert(index.get_record("A1.2") == records[3])
+        assert(index.get_fasta("C3") == ">C3.1 Third\nCCCC\n\n")
+        assert(index.find("A1.3") is None)
+        assert(index.find("A") is None)
+        assert(index.find("D4") is None)
+        assert("None" not in index and "B2" in index)
+
+    # An index from the older unsorted layout is rebuilt.
+    (tmp_path / "test.gb.gbi").write_text("B2.1\t0\t10\tSecond\n")
+    with GenBankIndex(str(genbank)) as index:
+        assert(index.get_record("B2") == records[0])
+    assert((tmp_path / "test.gb.gbi").read_bytes().startswith(GBI_HEADER))
+
+
+def test_convert_accessions_workers(tmp_path):
+    genbank = tmp_path / "test.gb"
+    genbank.write_text("".join(genbank_record("X%d.1" % i, "Record %d" % i, "acgt" * i)
+                               for i in range(1, 30)))
+    accessions = ["X%d" % i for i in range(40, 0, -3)]
+    single = io.StringIO()
+    assert(convert_accessions([str(genbank)], accessions, single) == 10)
+    pooled = io.StringIO()
+    assert(convert_accessions([str(genbank)], accessions, pooled, workers=2, chunksize=3) == 10)
+    assert(pooled.getvalue() == single.getvalue())
+    assert(single.getvalue().startswith(">X28.1 Record 28\n"))
@@ -0,0 +1,61 @@
+import io
+import math
+
+from assignment_1 import calculate_molecular_weight, calculate_molecular_weights, find_orfs, \
+    reverse_complement, translate_frame, translate_six_frames, write_orfs
+
+# A forward ORF (MKF) at 2-11 in frame 3 and a reverse-strand ORF (MGR) at 19-28
+SEQUENCE = "ccATGAAATTTTAAggTCAACGGCCCATa"
+
+
+# Tests for calculate_molecular_weights
+
+
+def test_molecular_weights_unknown_residues():
+    weight = calculate_molecular_weight("MKV*")
+    assert(math.isclose(weight, (131.1926 + 128.1741 + 99.1326 + 18.01528) / 1000))
+    try:
+        calculate_molecular_weights(["MKV", "MXKV"])
+        assert(False)
+    except ValueError as error:
+        assert(str(error) == "Unknown residues in protein sequence: X")
+    weights = calculate_molecular_weights(["MKV", "MBKZV", ""], errors="nan")
+    assert(weights[0] == weight and math.isnan(weights[1]) and weights[2] == 0.0)
+    assert(calculate_molecular_weights(["mbkzv"], errors="skip") == [weight])
+
+
+# Tests for translate_six_frames
+
+
+def test_translate_six_frames():
+    assert(reverse_complement("ACGTTu") == "aAACGT")
+    assert(translate_frame("ATGAAATT", 0) == "MK")
+    assert(translate_frame("ATGNNNTAA", 0) == "Mx-")
+    frames = translate_six_frames(SEQUENCE)
+    assert(frames == ["P-NFKVNGP", "HEILRSTAH", "MKF-GQRPI",
+                      "YGPLTLKFH", "MGR-P-NFM", "WAVDLKISW"])
+    reverse = reverse_complement(SEQUENCE.upper())
+    assert(frames[3:] == [translate_frame(reverse, start) for start in (0, 1, 2)])
+
+
+# Tests for find_orfs and write_orfs
+
+
+def test_find_orfs_both_strands():
+    orfs = find_orfs(SEQUENCE, 3)
+    assert(orfs == [("+", 3, 2, 11, "MKF"), ("-", 2, 19, 28, "MGR")])
+    assert(find_orfs(SEQUENCE, 1)[2] == ("-", 2, 1, 4, "M"))
+    for strand, frame, start, end, protein in orfs:
+        coding = SEQUENCE[start:end].upper()
+        if strand == "-":
+            coding = reverse_complement(coding)
+        assert(translate_frame(coding, 0) == protein)
+
+
+def test_write_orfs_fasta_and_bed():
+    fasta = io.StringIO()
+    bed = io.StringIO()
+    assert(write_orfs([("t1", find_orfs(SEQUENCE, 3)), ("t2", [])], fasta, bed) == 2)
+    assert(bed.getvalue() == "t1\t2\t11\tt1.p1\t3\t+\nt1\t19\t28\tt1.p2\t3\t-\n")
+    assert(fasta.getvalue() == ">t1.p1 t1:3-11(+) frame:3 length:3\nMKF\n"
+           ">t1.p2 t1:20-28(-) frame:2 length:3\nMGR\n")
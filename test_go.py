@@ -0,0 +1,194 @@
+import io
+import math
+
+from JimenezM_Assignment4 import AnnotationCache, GafFilter, GoClosure, GoIndex, GoOntology, \
+    cached_protein_to_go, find_parent_terms, load_ontology, propagate_annotations, \
+    write_propagation_tsv
+from go_similarity import GoSimilarity
+from go_slim import GoSlim
+
+
+# Tests for GoClosure
+
+
+def test_go_closure_diamond():
+    go_dict = {"GO:1": [], "GO:2": ["GO:1"], "GO:3": ["GO:1"], "GO:4": ["GO:2", "GO:3"],
+               "GO:5": ["GO:4", "GO:2"]}
+    closure = GoClosure(go_dict)
+    assert(closure.ancestors("GO:5") == {"GO:1", "GO:2", "GO:3", "GO:4"})
+    assert(len(closure.ancestor_indices("GO:5")) == 4)
+    assert(list(closure.ancestor_indices("GO:5")) == sorted(closure.ancestor_indices("GO:5")))
+    assert(closure.ancestors("GO:1") == set())
+    for go_id in go_dict:
+        assert(closure.ancestors(go_id) == find_parent_terms(go_id, go_dict))
+
+
+def test_go_closure_cycle():
+    for go_dict in ({"GO:1": ["GO:1"]}, {"GO:1": ["GO:2"], "GO:2": ["GO:1"]},
+                    {"GO:1": [], "GO:2": ["GO:1", "GO:4"], "GO:3": ["GO:2"], "GO:4": ["GO:3"]}):
+        try:
+            GoClosure(go_dict)
+            assert(False)
+        except ValueError as error:
+            assert(str(error) == "GO is_a relationships contain a cycle")
+
+
+def test_go_closure_parents_outside_ontology():
+    closure = GoClosure({"GO:1": [], "GO:2": ["GO:1", "GO:9"], "GO:3": ["GO:2"]})
+    assert(closure.ancestors("GO:3") == {"GO:1", "GO:2", "GO:9"})
+    assert(closure.ancestors("GO:9") == set())
+    assert(closure.ancestors("GO:8") == set())
+    indices, unknown = closure.propagate(["GO:2", "GO:8"])
+    assert({closure.go_ids[i] for i in indices} == {"GO:1", "GO:2", "GO:9"})
+    assert(unknown == {"GO:8"})
+
+
+# Tests for GoIndex
+
+
+def test_go_index_includes_descendants():
+    go_dict = {"GO:1": [], "GO:2": ["GO:1"], "GO:3": ["GO:2"], "GO:4": ["GO:1"]}
+    index = GoIndex(go_dict, {"P1": {"GO:3"}, "P2": {"GO:4"}, "P3": {"GO:2", "GO:9"}})
+    assert(index.children("GO:1") == {"GO:2", "GO:4"})
+    assert(index.descendants("GO:1") == {"GO:2", "GO:3", "GO:4"})
+    assert(index.proteins_for("GO:1") == {"P1", "P2", "P3"})
+    assert(index.proteins_for("GO:2") == {"P1", "P3"})
+    assert(index.proteins_for("GO:2", descendants=False) == {"P3"})
+    assert(index.proteins_for("GO:9") == {"P3"})
+    assert(index.any_of(["GO:3", "GO:4"]) == {"P1", "P2"})
+    assert(index.all_of(["GO:2", "GO:9"]) == {"P3"})
+    assert(index.all_of(["GO:3", "GO:4"]) == set())
+
+
+# Tests for propagate_annotations
+
+
+def test_propagation_writes_each_ancestor_once():
+    closure = GoClosure({"GO:1": [], "GO:2": ["GO:1"], "GO:3": ["GO:2"], "GO:4": ["GO:1"]})
+    output = io.StringIO()
+    write_propagation_tsv(propagate_annotations({"P2": {"GO:3", "GO:4", "GO:9"}, "P1": set()},
+                                                closure), output, buffer_lines=1)
+    assert(output.getvalue() == "P1\nP2\tGO:1\tGO:2\tGO:3\tGO:4\tGO:9\n")
+
+
+# Tests for GoSimilarity
+
+
+def test_go_similarity():
+    closure = GoClosure({"GO:1": [], "GO:2": ["GO:1"], "GO:3": ["GO:2"], "GO:4": ["GO:1"]})
+    similarity = GoSimilarity(closure, {"P1": {"GO:3"}, "P2": {"GO:4"}, "P3": {"GO:2"}})
+    go_3, go_2 = closure.index["GO:3"], closure.index["GO:2"]
+    assert(similarity.ic[closure.index["GO:1"]] == 0)
+    assert(math.isclose(similarity.resnik(go_3, go_2), math.log(3 / 2)))
+    assert(math.isclose(similarity.lin(go_3, go_2), 2 * math.log(1.5) / (math.log(3) + math.log(1.5))))
+    matrix = similarity.similarity_matrix(["P1", "P2", "P3", "P9"])
+    assert(list(matrix[0]) == [math.log(3), 0.0, similarity.resnik(go_3, go_2), 0.0])
+    assert(matrix[2][0] == matrix[0][2])
+    assert(math.isclose(similarity.protein_similarity("P1", "P3"), matrix[0][2]))
+    closure = GoClosure({"GO:1": [], "GO:2": ["GO:1"], "GO:3": ["GO:2"], "GO:5": [], "GO:6": ["GO:5"],
+                         "GO:7": ["GO:5"]})
+    similarity = GoSimilarity(closure, {"P1": {"GO:3"}, "P2": {"GO:3", "GO:6"}, "P3": {"GO:6"},
+                                        "P4": {"GO:7"}})
+    matrix = similarity.similarity_matrix(["P1", "P2", "P3", "P4"])
+    assert(matrix[0][2] == matrix[2][3] == 0.0)
+    assert(matrix[1][2] > 0.0)
+    assert([[round(value, 12) for value in row] for row in matrix] == [
+        [round(similarity.protein_similarity(a, b), 12) for b in ["P1", "P2", "P3", "P4"]]
+        for a in ["P1", "P2", "P3", "P4"]])
+
+
+# Tests for GoSlim
+
+
+def test_go_slim_maps_to_nearest_slim_terms():
+    ontology = GoOntology.from_lines([
+        "[Term]\n", "id: GO:1\n", "\n",
+        "[Term]\n", "id: GO:2\n", "is_a: GO:1\n", "\n",
+        "[Term]\n", "id: GO:3\n", "is_a: GO:2\n", "is_a: GO:4\n", "alt_id: GO:7\n", "\n",
+        "[Term]\n", "id: GO:4\n", "is_a: GO:1\n", "\n",
+        "[Term]\n", "id: GO:5\n", "is_a: GO:3\n", "\n"])
+    slim = GoSlim(ontology, ["GO:1", "GO:2", "GO:4"])
+    assert(slim.map_term("GO:5") == ["GO:2", "GO:4"])
+    assert(slim.map_term("GO:2") == ["GO:2"])
+    assert(slim.map_term("GO:7") == ["GO:2", "GO:4"])
+    annotations = {"P1": {"GO:5"}, "P2": {"GO:1"}, "P3": {"GO:9"}, "P4": {"GO:3", "GO:4"}}
+    assert(list(slim.remap(annotations)) == [("P1", ["GO:2", "GO:4"]), ("P2", ["GO:1"]),
+                                             ("P4", ["GO:2", "GO:4"])])
+    counts, unmapped = slim.counts(annotations)
+    assert(list(counts) == [1, 2, 2])
+    assert(unmapped == 1)
+
+    ontology = GoOntology.from_lines([
+        "[Term]\n", "id: GO:1\n", "\n",
+        "[Term]\n", "id: GO:4\n", "is_a: GO:1\n", "\n",
+        "[Term]\n", "id: GO:6\n", "is_a: GO:1\n", "relationship: part_of GO:4 ! four\n"])
+    assert(GoSlim(ontology, ["GO:1", "GO:4"]).map_term("GO:6") == ["GO:4"])
+    assert(GoSlim(ontology, ["GO:1", "GO:4"], part_of=False).map_term("GO:6") == ["GO:1"])
+
+
+# Tests for GafFilter
+
+
+def test_gaf_filter_counts_rejected_lines(tmp_path):
+    gaf = tmp_path / "test.gaf"
+    gaf.write_text("!gaf-version: 2.2\n" + "".join(
+        "\t".join(["UniProtKB", protein, "", qualifier, go_id, "REF", evidence, "", aspect, "", "",
+                   "protein", taxon, "20200101", "DB", "", ""]) + "\n"
+        for protein, qualifier, go_id, evidence, aspect, taxon in [
+            ("P1", "", "GO:1", "IDA", "P", "taxon:9606"),
+            ("P1", "NOT|enables", "GO:2", "IDA", "F", "taxon:9606"),
+            ("P2", "", "GO:3", "IEA", "P", "taxon:9606"),
+            ("P3", "", "GO:4", "EXP", "C", "taxon:10090|taxon:9606"),
+            ("P4", "contributes_to", "GO:5", "IMP", "F", "taxon:9606")]) + "UniProtKB\tP5\n")
+    gaf_filter = GafFilter(exclude_qualifiers={"NOT"}, exclude_evidence={"IEA"}, taxa={"9606"})
+    mapping = gaf_filter.load(str(gaf))
+    assert(dict(mapping) == {"P1": {"GO:1"}, "P4": {"GO:5"}})
+    # The short line has no taxon, so the taxon scan rejects it before it is split.
+    assert(gaf_filter.counts == {"lines": 7, "comments": 1, "malformed": 0, "kept": 2,
+                                 "qualifier": 1, "evidence": 1, "taxon": 2})
+    assert(repr(gaf_filter) == "GafFilter(qualifier!=NOT;evidence!=IEA;taxon=taxon:9606)")
+    assert(dict(GafFilter(evidence={"IDA"}, aspects={"P"}).load(str(gaf))) == {"P1": {"GO:1"}})
+    gaf_filter = GafFilter(exclude_evidence={"IEA"})
+    gaf_filter.load(str(gaf))
+    assert(gaf_filter.counts == {"lines": 7, "comments": 1, "malformed": 1, "kept": 4,
+                                 "evidence": 1})
+
+
+# Tests for cached_protein_to_go
+
+
+def test_truncated_cache_is_rebuilt(tmp_path):
+    gaf = tmp_path / "test.gaf"
+    gaf.write_text("".join("\t".join(["UniProtKB", protein, protein, go_id, "REF", "IDA", "P"])
+                           + "\n" for protein, go_id in [("P1", "GO:1"), ("P2", "GO:2")]))
+    cache = tmp_path / "test.cache"
+    assert(dict(cached_protein_to_go(str(gaf), cache_filename=str(cache))) ==
+           {"P1": {"GO:1"}, "P2": {"GO:2"}})
+    data = cache.read_bytes()
+    for length in (len(data) - 1, len(data) - 3, 40):
+        cache.write_bytes(data[:length])
+        try:
+            AnnotationCache(str(cache))
+            assert(False)
+        except ValueError:
+            pass
+        assert(dict(cached_protein_to_go(str(gaf), cache_filename=str(cache))) ==
+               {"P1": {"GO:1"}, "P2": {"GO:2"}})
+        assert(cache.read_bytes() == data)
+    assert([path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == [])
+
+
+# Tests for load_ontology
+
+
+def test_truncated_snapshot_is_reparsed(tmp_path):
+    obo = tmp_path / "go.obo"
+    obo.write_text("[Term]\nid: GO:1\nname: root\n\n[Term]\nid: GO:2\nname: child\nis_a: GO:1\n")
+    snapshot = tmp_path / "go.obo.pickle"
+    assert(load_ontology(str(obo)).names() == {"GO:1": "root", "GO:2": "child"})
+    data = snapshot.read_bytes()
+    for length in (0, 1, len(data) // 2, len(data) - 1):
+        snapshot.write_bytes(data[:length])
+        assert(load_ontology(str(obo)).names() == {"GO:1": "root", "GO:2": "child"})
+        assert(snapshot.read_bytes() == data)
+    assert([path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == [])